@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from fivetran_helper import filter_disabled, filter_disabled_file
+
+# Time and peak memory of filtering a synthetic Salesforce sized schema, 100k columns by default
+# e.g. ./benchmark_filter_disabled.py --tables 2000 --columns 50 --disabled 0.1
+
+
+def filter_disabled_recursive(item):
+    # The original implementation, kept as the reference
+    if isinstance(item, dict):
+        return {
+            key: filter_disabled_recursive(value)
+            for key, value in item.items()
+            if not isinstance(value, dict) or "enabled" not in value or value["enabled"]
+        }
+    return item
+
+
+def make_schema(tables, columns, disabled, schemas=4):
+    """
+    Every 1 / disabled-th table and column is disabled, so most tables are fully enabled.
+    """
+    step = max(1, round(1 / disabled)) if disabled else 0
+
+    def enabled(number):
+        return not step or number % step != step - 1
+
+    return {
+        "schema_change_handling": "ALLOW_COLUMNS",
+        "schemas": {
+            f"schema_{schema_number}": {
+                "name_in_destination": f"schema_{schema_number}",
+                "enabled": True,
+                "tables": {
+                    f"table_{table_number}": {
+                        "name_in_destination": f"table_{table_number}",
+                        "enabled": enabled(table_number),
+                        "sync_mode": "SOFT_DELETE",
+                        "columns": {
+                            f"column_{column_number}": {
+                                "name_in_destination": f"column_{column_number}",
+                                "enabled": enabled(table_number * columns + column_number),
+                                "hashed": False,
+                            }
+                            for column_number in range(columns)
+                        },
+                    }
+                    for table_number in range(schema_number, tables, schemas)
+                },
+            }
+            for schema_number in range(schemas)
+        },
+    }
+
+
+def measure(function, make_args):
+    """
+    Time on its own then peak memory allocated on top of the arguments, tracemalloc slows the
+    function down too much to time both in one run.
+    """
+    args = make_args()
+    start = time.perf_counter()
+    function(*args)
+    elapsed = time.perf_counter() - start
+    args = make_args()
+    tracemalloc.start()
+    result = function(*args)
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak_bytes / 1024 / 1024
+
+
+def load_filter_dump(input_file, output_file):
+    # What writing enabled/ from a file costs without the streaming variant
+    with open(input_file) as f:
+        item = filter_disabled_recursive(json.load(f))
+    with open(output_file, "w") as f:
+        f.write(json.dumps(item, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tables", type=int, default=2000)
+    parser.add_argument("--columns", type=int, default=50)
+    parser.add_argument("--disabled", type=float, default=0.1)
+    arguments = parser.parse_args()
+
+    text = json.dumps(make_schema(arguments.tables, arguments.columns, arguments.disabled))
+    expected = filter_disabled_recursive(json.loads(text))
+    print(f"{arguments.tables} tables x {arguments.columns} columns, {len(text) / 1024 / 1024:.1f}MB")
+    print(f"{'':>14} {'time':>9} {'peak':>9}")
+
+    in_memory = {
+        "recursive": filter_disabled_recursive,
+        "copy-on-write": filter_disabled,
+        "in-place": lambda item: filter_disabled(item, in_place=True),
+    }
+    for name, function in in_memory.items():
+        result, elapsed, peak = measure(function, lambda: (json.loads(text),))
+        assert result == expected, name
+        print(f"{name:>14} {elapsed:8.3f}s {peak:7.1f}MB")
+
+    with tempfile.TemporaryDirectory() as directory:
+        input_file = os.path.join(directory, "schema.json")
+        output_file = os.path.join(directory, "enabled.json")
+        with open(input_file, "w") as f:
+            f.write(text)
+        for name, function in [("file", load_filter_dump), ("file-streaming", filter_disabled_file)]:
+            _, elapsed, peak = measure(function, lambda: (input_file, output_file))
+            with open(output_file) as f:
+                assert json.load(f) == expected, name
+            print(f"{name:>14} {elapsed:8.3f}s {peak:7.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
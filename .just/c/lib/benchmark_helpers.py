@@ -0,0 +1,357 @@
+#!/usr/bin/env python
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from urllib.request import urlopen
+
+from stand_in_servers import add_arguments
+
+# End to end timings of the Fivetran dumps and the sql-file-* paths against stand_in_servers.py, each
+# scenario in a fresh process so its peak memory is its own. Results are appended to --history to
+# follow them over time, and compared with the previous run of the same scenario and settings
+# e.g. ./benchmark_helpers.py --connectors 200 --latency 0.05 --throttle 0.02
+#      ./benchmark_helpers.py --scenarios fivetran-dump sql-file-parameters-cold
+
+LIB_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+HISTORY_FILE = "/workspace/benchmarks/helper-benchmarks.jsonl"
+REGIONS = ["na", "eu"]
+
+
+def write_bundle(repo_directory, job_files, tasks):
+    """
+    databricks.yml, job definitions and the SQL files they run, laid out like data-pipelines.
+    """
+    from benchmark_yaml_loading import write_synthetic_job_files
+
+    jobs_directory = os.path.join(repo_directory, "resources", "jobs")
+    os.makedirs(jobs_directory, exist_ok=True)
+    write_synthetic_job_files(jobs_directory, job_files, tasks)
+    for job_number in range(job_files):
+        sql_directory = os.path.join(repo_directory, "sql", f"job_{job_number}")
+        os.makedirs(sql_directory, exist_ok=True)
+        for task_number in range(tasks):
+            with open(os.path.join(sql_directory, f"task_{task_number}.sql"), "w") as file:
+                file.write(
+                    "CREATE OR REPLACE TABLE {{output_schema_name}}.task AS\n"
+                    "SELECT * FROM {{output_schema_name}}.source\n"
+                )
+    with open(os.path.join(repo_directory, "databricks.yml"), "w") as file:
+        json.dump(
+            {
+                "bundle": {"name": "data_pipelines"},
+                "variables": {"WAREHOUSE_ID": {"default": "stand-in"}},
+                "targets": {
+                    f"personal_dev_{region}": {
+                        "variables": {"ENV_CATALOG_IDENTIFIER": f"catalog_{region}"}
+                    }
+                    for region in REGIONS
+                },
+            },
+            file,
+        )
+
+
+def write_databricks_config(file_path, url):
+    with open(file_path, "w") as file:
+        for region in REGIONS:
+            file.write(f"[default-{region}]\nhost = {url}\ntoken = dapi-stand-in\n\n")
+
+
+# Scenarios, each run in its own process with the helpers pointed at the stand-in and work directory
+
+
+def use_work_directory(work_directory):
+    import databricks_helper
+
+    repo_directory = os.path.join(work_directory, "repo")
+    cache_directory = os.path.join(work_directory, "cache")
+    databricks_helper.REPO_DIRECTORY = repo_directory
+    databricks_helper.RESOURCES_DIRECTORY = os.path.join(repo_directory, "resources")
+    databricks_helper.SQL_DIRECTORY = os.path.join(repo_directory, "sql")
+    databricks_helper.TEMP_JOB_DIRECTORY = os.path.join(repo_directory, "resources", "_temp_")
+    databricks_helper.CACHE_DIRECTORY = cache_directory
+    databricks_helper.JOB_INDEX_FILE = os.path.join(cache_directory, "job-index.json")
+    databricks_helper.IDENTITY_CACHE_FILE = os.path.join(cache_directory, "identity.json")
+    databricks_helper.RENDERED_SQL_DIRECTORY = os.path.join(cache_directory, "rendered")
+    return databricks_helper
+
+
+def get_first_sql_file(databricks_helper):
+    return os.path.join(databricks_helper.SQL_DIRECTORY, "job_0", "task_0.sql")
+
+
+def run_fivetran_dump(work_directory, workers):
+    from fivetran_helper import dump
+
+    dump(os.path.join(work_directory, "fivetran"), workers=workers)
+
+
+def run_fivetran_dump_bulk(work_directory, workers):
+    from fivetran_helper import dump
+
+    dump(os.path.join(work_directory, "fivetran-bulk"), workers=workers, output_format="bulk")
+
+
+def run_fivetran_dump_raw(work_directory, workers):
+    from fivetran_helper import dump_raw
+
+    dump_raw(os.path.join(work_directory, "fivetran", "raw"), workers=workers)
+
+
+def run_fivetran_dump_state(work_directory, workers):
+    from fivetran_helper import dump_state
+
+    dump_state(os.path.join(work_directory, "fivetran"), workers=workers)
+
+
+def run_job_catalogue(work_directory, workers):
+    use_work_directory(work_directory).load_job_catalogue("default-na", refresh=True)
+
+
+def run_sql_file_parameters_cold(work_directory, workers):
+    # As a first sql-file-get-parameters: no job index, no cached identity
+    databricks_helper = use_work_directory(work_directory)
+    for file_path in [databricks_helper.JOB_INDEX_FILE, databricks_helper.IDENTITY_CACHE_FILE]:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(file_path)
+    databricks_helper.find_parameters_for_sql_task("na", get_first_sql_file(databricks_helper))
+
+
+def run_sql_file_parameters(work_directory, workers):
+    databricks_helper = use_work_directory(work_directory)
+    databricks_helper.find_parameters_for_sql_task("na", get_first_sql_file(databricks_helper))
+
+
+def run_sql_files_inject_parameters(work_directory, workers):
+    databricks_helper = use_work_directory(work_directory)
+    databricks_helper.inject_parameters_into_sql_files(
+        REGIONS, output_directory=databricks_helper.RENDERED_SQL_DIRECTORY
+    )
+
+
+def run_sql_file_create_temp_job(work_directory, workers):
+    databricks_helper = use_work_directory(work_directory)
+    databricks_helper.create_temp_job_for_sql_task("na", get_first_sql_file(databricks_helper))
+
+
+# name: (function, span whose timings are reported as the latency)
+SCENARIOS = {
+    "fivetran-dump": (run_fivetran_dump, "api_get.request"),
+    "fivetran-dump-bulk": (run_fivetran_dump_bulk, "api_get.request"),
+    "fivetran-dump-raw": (run_fivetran_dump_raw, "api_get.request"),
+    "fivetran-dump-state": (run_fivetran_dump_state, "api_get.request"),
+    "databricks-job-catalogue": (run_job_catalogue, "sdk.jobs.list"),
+    "sql-file-parameters-cold": (run_sql_file_parameters_cold, "load_job_index"),
+    "sql-file-parameters": (run_sql_file_parameters, "load_job_index"),
+    "sql-files-inject-parameters": (run_sql_files_inject_parameters, "load_job_index"),
+    "sql-file-create-temp-job": (run_sql_file_create_temp_job, "load_job_index"),
+}
+
+
+def run_scenario(name, work_directory, workers):
+    function, _ = SCENARIOS[name]
+    start = time.perf_counter()
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            function(work_directory, workers)
+    except Exception as e:
+        print(json.dumps({"error": repr(e)}))
+        raise
+    print(json.dumps({"elapsed": time.perf_counter() - start}))
+
+
+# Parent side
+
+
+def get_stats(url):
+    with urlopen(f"{url}/_stats") as response:
+        return json.load(response)
+
+
+def get_commit():
+    result = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"], cwd=LIB_DIRECTORY, capture_output=True, text=True
+    )
+    return result.stdout.strip() or None
+
+
+def measure_scenario(name, url, work_directory, arguments):
+    """
+    Run one scenario in a child process, returning its elapsed time, request counts, latency of
+    its span and peak RSS.
+    """
+    trace_file = os.path.join(work_directory, f"{name}.trace.json")
+    output_file = os.path.join(work_directory, f"{name}.out")
+    errors_file = os.path.join(work_directory, f"{name}.err")
+    environment = {
+        **os.environ,
+        "FIVETRAN_API_URL": f"{url}/v1",
+        "FIVETRAN_REQUESTS_PER_SECOND": str(arguments.requests_per_second),
+        "FTA": "stand-in",
+        "DATABRICKS_CONFIG_FILE": os.path.join(work_directory, "databrickscfg"),
+        "HELPER_TRACE": "1",
+        "HELPER_TRACE_SUMMARY": trace_file,
+    }
+    before = get_stats(url)
+    with open(output_file, "w") as output, open(errors_file, "w") as errors:
+        process = subprocess.Popen(
+            [
+                sys.executable,
+                os.path.abspath(__file__),
+                "--run-scenario",
+                name,
+                "--work-directory",
+                work_directory,
+                "--workers",
+                str(arguments.workers),
+            ],
+            cwd=LIB_DIRECTORY,
+            env=environment,
+            stdout=output,
+            stderr=errors,
+        )
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    after = get_stats(url)
+    with open(output_file) as output:
+        lines = output.read().splitlines()
+    # The last line is the scenario's {"elapsed"} or {"error"}, the trace table goes to stderr
+    outcome = json.loads(lines[-1]) if lines else {"error": f"exit code {process.returncode}"}
+
+    result = {
+        "scenario": name,
+        "requests": after["requests"] - before["requests"],
+        "throttled": after["throttled"] - before["throttled"],
+        # ru_maxrss is in KB on Linux
+        "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),
+    }
+    if "error" in outcome:
+        return {**result, "error": outcome["error"]}
+    elapsed = outcome["elapsed"]
+    result["elapsed_s"] = round(elapsed, 3)
+    result["requests_per_second"] = round(result["requests"] / elapsed, 1)
+    try:
+        with open(trace_file) as file:
+            span = json.load(file).get(SCENARIOS[name][1])
+    except (OSError, ValueError):
+        span = None
+    if span:
+        result["latency_mean_ms"] = round(span["total_ms"] / span["count"], 2)
+        result["latency_p95_ms"] = round(span["p95_ms"], 2)
+    return result
+
+
+def load_history(history_file):
+    try:
+        with open(history_file) as file:
+            return [json.loads(line) for line in file if line.strip()]
+    except OSError:
+        return []
+
+
+def format_change(current, previous, key):
+    if previous is None or key not in current or not previous.get(key):
+        return ""
+    return f" ({(current[key] - previous[key]) / previous[key]:+.0%})"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--requests-per-second", type=float, default=1000)
+    parser.add_argument("--job-files", type=int, default=200)
+    parser.add_argument("--tasks", type=int, default=5)
+    parser.add_argument("--history", default=HISTORY_FILE)
+    parser.add_argument("--run-scenario", help=argparse.SUPPRESS)
+    parser.add_argument("--work-directory", help=argparse.SUPPRESS)
+    add_arguments(parser)
+    arguments = parser.parse_args()
+
+    if arguments.run_scenario:
+        run_scenario(arguments.run_scenario, arguments.work_directory, arguments.workers)
+        return
+
+    settings = {
+        key: getattr(arguments, key)
+        for key in [
+            "connectors",
+            "destinations",
+            "schemas",
+            "tables",
+            "columns",
+            "jobs",
+            "latency",
+            "throttle",
+            "workers",
+            "requests_per_second",
+            "job_files",
+            "tasks",
+        ]
+    }
+    server_arguments = [
+        f"--{key.replace('_', '-')}={getattr(arguments, key)}"
+        for key in ["connectors", "destinations", "schemas", "tables", "columns", "jobs"]
+        + ["latency", "throttle", "retry_after"]
+    ]
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(LIB_DIRECTORY, "stand_in_servers.py"), "--port=0"]
+        + server_arguments,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    history = load_history(arguments.history)
+    results = []
+    try:
+        url = json.loads(server.stdout.readline())["url"]
+        with tempfile.TemporaryDirectory() as work_directory:
+            write_bundle(os.path.join(work_directory, "repo"), arguments.job_files, arguments.tasks)
+            write_databricks_config(os.path.join(work_directory, "databrickscfg"), url)
+            print(
+                f"{'scenario':<28} {'elapsed':>9} {'requests':>9} {'req/s':>8} {'429s':>5}"
+                f" {'mean ms':>8} {'p95 ms':>8} {'peak MB':>8}"
+            )
+            for name in arguments.scenarios:
+                result = measure_scenario(name, url, work_directory, arguments)
+                results.append(result)
+                if "error" in result:
+                    print(f"{name:<28} failed: {result['error']}")
+                    continue
+                previous = next(
+                    (
+                        entry
+                        for entry in reversed(history)
+                        if entry["scenario"] == name and entry["settings"] == settings
+                        and "error" not in entry
+                    ),
+                    None,
+                )
+                print(
+                    f"{name:<28} {result['elapsed_s']:>8.2f}s {result['requests']:>9}"
+                    f" {result['requests_per_second']:>8.1f} {result['throttled']:>5}"
+                    f" {result.get('latency_mean_ms', '-'):>8} {result.get('latency_p95_ms', '-'):>8}"
+                    f" {result['peak_rss_mb']:>8}"
+                    f"{format_change(result, previous, 'elapsed_s')}"
+                )
+    finally:
+        server.terminate()
+        server.wait()
+
+    os.makedirs(os.path.dirname(os.path.abspath(arguments.history)), exist_ok=True)
+    recorded_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    commit = get_commit()
+    with open(arguments.history, "a") as file:
+        for result in results:
+            entry = {"recorded_at": recorded_at, "commit": commit, "settings": settings, **result}
+            file.write(json.dumps(entry) + "\n")
+    print(f"Results appended to {arguments.history}")
+
+
+if __name__ == "__main__":
+    main()
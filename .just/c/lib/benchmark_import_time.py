@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+# Cold start cost of each recipe's import lines, read from the .justfile of --just-directory and
+# measured in fresh interpreters the way just runs them
+# e.g. ./benchmark_import_time.py --runs 5
+#      ./benchmark_import_time.py --just-directory ../../h
+
+RECIPE_PATTERN = re.compile(r"^([A-Za-z][\w-]*)[^:]*:(?!=)")
+IMPORT_PATTERN = re.compile(r"^\s+((?:from|import) lib\.\S.*)$")
+# Imports a recipe should only pay for when it actually talks to the workspace
+HEAVY_MODULES = ["databricks.sdk", "git"]
+
+
+def get_recipe_imports(just_directory):
+    """
+    {import statement: [recipes]} for the recipes of the .justfile in just_directory that import
+    from its lib, each recipe's import lines joined into one statement.
+    """
+    imports = {}
+    recipe = None
+    lines = []
+
+    def add():
+        if recipe and lines:
+            imports.setdefault("; ".join(lines), []).append(recipe)
+
+    with open(os.path.join(just_directory, ".justfile")) as f:
+        for line in f:
+            match = RECIPE_PATTERN.match(line)
+            if match:
+                add()
+                recipe, lines = match.group(1), []
+                continue
+            match = IMPORT_PATTERN.match(line)
+            if match and recipe:
+                lines.append(match.group(1).strip())
+    add()
+    return imports
+
+
+def parse_import_time(stderr):
+    """
+    -X importtime output as ({top level module: cumulative microseconds}, {every module imported}).
+    """
+    top_level = {}
+    modules = set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        modules.add(name.strip())
+        # Nested imports are indented below the module importing them
+        if not name.startswith("  "):
+            top_level[name.strip()] = int(cumulative)
+    return top_level, modules
+
+
+def measure(just_directory, statement):
+    code = f"import sys; sys.path.append('.'); {statement}"
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=just_directory,
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode:
+        return None, None, None, result.stderr.strip().splitlines()[-1]
+    return elapsed, *parse_import_time(result.stderr), None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--just-directory", default=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=3)
+    arguments = parser.parse_args()
+
+    baseline, _, _, _ = measure(arguments.just_directory, "pass")
+    print(f"{'interpreter':<36} {baseline * 1000:8.1f}ms")
+    for statement, recipes in get_recipe_imports(arguments.just_directory).items():
+        recipe = recipes[0] if len(recipes) == 1 else f"{recipes[0]} (+{len(recipes) - 1})"
+        timings = []
+        for _ in range(arguments.runs):
+            elapsed, top_level, modules, error = measure(arguments.just_directory, statement)
+            if error:
+                break
+            timings.append(elapsed)
+        if error:
+            print(f"{recipe:<36} {'n/a':>10} {error}")
+            continue
+        heavy = [module for module in HEAVY_MODULES if module in modules or any(
+            name.startswith(f"{module}.") for name in modules
+        )]
+        heaviest = sorted(top_level.items(), key=lambda item: -item[1])[: arguments.top]
+        print(
+            f"{recipe:<36} {statistics.median(timings) * 1000:8.1f}ms"
+            f"  heavy: {', '.join(heavy) or '-'}"
+            f"  top: {', '.join(f'{name} {us / 1000:.1f}ms' for name, us in heaviest)}"
+        )
+
+
+if __name__ == "__main__":
+    main()
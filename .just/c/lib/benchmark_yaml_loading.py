@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+import argparse
+import os
+import tempfile
+import time
+
+import yaml
+
+from yaml_loading import YAML_PROCESSES, load_yaml_files
+
+# Compares serial vs parallel and pure Python vs libyaml loading on a synthetic resources tree
+# e.g. ./benchmark_yaml_loading.py --files 500 --tasks 20
+
+
+def write_synthetic_job_files(directory, files, tasks):
+    file_paths = []
+    for job_number in range(files):
+        job_name = f"job_{job_number}"
+        structure = {
+            "resources": {
+                "jobs": {
+                    job_name: {
+                        "name": job_name,
+                        "parameters": [{"name": "env", "default": "${var.ENV_CATALOG_IDENTIFIER}"}],
+                        "tasks": [
+                            {
+                                "task_key": f"task_{task_number}",
+                                "depends_on": [{"task_key": f"task_{task_number - 1}"}]
+                                if task_number
+                                else [],
+                                "sql_task": {
+                                    "file": {"path": f"../../sql/{job_name}/task_{task_number}.sql"},
+                                    "parameters": {"output_schema_name": "${var.ENV_SCHEMA_PREFIX}x"},
+                                    "warehouse_id": "${var.WAREHOUSE_ID}",
+                                },
+                            }
+                            for task_number in range(tasks)
+                        ],
+                    }
+                }
+            }
+        }
+        file_path = os.path.join(directory, f"{job_name}.yml")
+        with open(file_path, "w") as file:
+            yaml.dump(structure, file, default_flow_style=False)
+        file_paths.append(file_path)
+    return file_paths
+
+
+def time_loading(file_paths, processes, loader):
+    start = time.perf_counter()
+    load_yaml_files(file_paths, processes=processes, loader=loader)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--tasks", type=int, default=20)
+    parser.add_argument("--processes", type=int, default=YAML_PROCESSES)
+    arguments = parser.parse_args()
+
+    loaders = {"pure": yaml.SafeLoader}
+    if hasattr(yaml, "CSafeLoader"):
+        loaders["libyaml"] = yaml.CSafeLoader
+    else:
+        print("libyaml not available, CSafeLoader skipped")
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_paths = write_synthetic_job_files(directory, arguments.files, arguments.tasks)
+        print(f"{arguments.files} files x {arguments.tasks} tasks")
+        for loader_name, loader in loaders.items():
+            for mode, processes in [("serial", 1), (f"parallel({arguments.processes})", arguments.processes)]:
+                elapsed = time_loading(file_paths, processes, loader)
+                print(f"{loader_name:>8} {mode:>12} {elapsed:8.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+import contextlib
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+import traceback
+
+# Optional long lived process keeping databricks_helper warm (SDK imported, workspace client
+# authenticated, databricks.yml parsed, job index in memory) for the just recipes, which send it
+# requests over a Unix socket. When it isn't running call() runs the function in-process instead.
+#   ./databricks_daemon.py            run in the foreground
+#   ./databricks_daemon.py --stop     stop a running daemon
+
+SOCKET_FILE = "/tmp/databricks-helper/daemon.sock"
+WATCH_INTERVAL_SECONDS = 1.0
+# A daemon that can't be connected to within CONNECT_TIMEOUT_SECONDS is skipped and the function run
+# in-process. Once a request has been sent it is never run again in-process, the daemon may still
+# be running it, so a request unanswered after REQUEST_TIMEOUT_SECONDS fails instead
+CONNECT_TIMEOUT_SECONDS = 5.0
+REQUEST_TIMEOUT_SECONDS = 1800.0
+FUNCTIONS = [
+    "find_parameters_for_sql_task",
+    "inject_parameters_into_sql_file",
+    "inject_parameters_into_sql_files",
+    "get_identifier_from_sql_file",
+    "create_temp_job_for_sql_task",
+    "create_temp_job_for_sql_tasks",
+    "create_temp_job_with_upstream",
+    "print_upstream_tasks",
+    "print_downstream_tasks",
+]
+
+
+def log(message):
+    # stderr, as stdout is redirected into the response of whichever request is being handled
+    print(message, file=sys.stderr)
+
+
+def import_helper():
+    try:
+        from . import databricks_helper
+    except ImportError:
+        import databricks_helper
+    return databricks_helper
+
+
+def connect(socket_file=SOCKET_FILE):
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.settimeout(CONNECT_TIMEOUT_SECONDS)
+        client.connect(socket_file)
+    except BaseException:
+        client.close()
+        raise
+    return client
+
+
+def exchange(client, request, timeout=REQUEST_TIMEOUT_SECONDS):
+    with client:
+        client.settimeout(timeout)
+        client.sendall(json.dumps(request).encode() + b"\n")
+        with client.makefile("rb") as response:
+            return json.loads(response.readline())
+
+
+def send(request, socket_file=SOCKET_FILE):
+    return exchange(connect(socket_file), request)
+
+
+def call(function, *args, **kwargs):
+    """
+    Run a databricks_helper function in the daemon when one is listening, otherwise in-process.
+    """
+    try:
+        client = connect()
+    except (FileNotFoundError, ConnectionRefusedError, socket.timeout):
+        return getattr(import_helper(), function)(*args, **kwargs)
+    try:
+        response = exchange(client, {"function": function, "args": args, "kwargs": kwargs})
+    except socket.timeout:
+        raise SystemError(
+            f"Helper daemon did not answer {function} within {REQUEST_TIMEOUT_SECONDS}s and may "
+            "still be running it, stop it with databricks_daemon.py --stop before retrying"
+        )
+    sys.stdout.write(response["output"])
+    if response["error"]:
+        raise SystemError(f"{function} failed in the helper daemon:\n{response['error']}")
+    return response["result"]
+
+
+class HelperState:
+    def __init__(self):
+        self.helper = import_helper()
+        self.lock = threading.Lock()
+        self.signature = None
+        self.running = True
+
+    def get_signature(self):
+        files = [os.path.join(self.helper.REPO_DIRECTORY, "databricks.yml")]
+        files.extend(self.helper.yield_job_files())
+        signature = []
+        for file in files:
+            try:
+                stat = os.stat(file)
+                signature.append((file, stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                pass
+        return signature
+
+    def refresh(self):
+        signature = self.get_signature()
+        if signature == self.signature:
+            return
+        with self.lock:
+            self.helper.load_databricks_configuration.cache_clear()
+            self.helper.get_bundle_resolver.cache_clear()
+            self.helper.use_warm_job_index(None)
+            self.helper.use_warm_job_index(self.helper.load_job_index())
+            self.signature = signature
+        log(f"Job index and configuration refreshed, {len(signature)} files watched")
+
+    def warm_up(self):
+        self.refresh()
+        try:
+            self.helper.get_workspace_client()
+            self.helper.get_schema_prefix()
+        except Exception as e:
+            log(f"Workspace client warm up failed, it will be retried on first use: {e}")
+
+    def watch(self):
+        while self.running:
+            time.sleep(WATCH_INTERVAL_SECONDS)
+            try:
+                self.refresh()
+            except Exception:
+                traceback.print_exc()
+
+    def handle(self, request):
+        function = request["function"]
+        if function not in FUNCTIONS:
+            return {"output": "", "result": None, "error": f"{function} is not served"}
+        output = io.StringIO()
+        with self.lock, contextlib.redirect_stdout(output):
+            try:
+                result = getattr(self.helper, function)(*request["args"], **request["kwargs"])
+                error = None
+            except Exception:
+                result, error = None, traceback.format_exc()
+        return {"output": output.getvalue(), "result": result, "error": error}
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        request = json.loads(self.rfile.readline())
+        if request["function"] == "shutdown":
+            self.server.state.running = False
+            threading.Thread(target=self.server.shutdown).start()
+            response = {"output": "Helper daemon stopping\n", "result": None, "error": None}
+        else:
+            response = self.server.state.handle(request)
+        self.wfile.write(json.dumps(response, default=str).encode() + b"\n")
+
+
+def serve(socket_file=SOCKET_FILE):
+    os.makedirs(os.path.dirname(socket_file), exist_ok=True)
+    if os.path.exists(socket_file):
+        try:
+            send({"function": "ping"}, socket_file)
+            raise SystemError(f"A helper daemon is already listening on {socket_file}")
+        except ConnectionRefusedError:
+            os.remove(socket_file)
+
+    state = HelperState()
+    state.warm_up()
+    threading.Thread(target=state.watch, daemon=True).start()
+    with socketserver.UnixStreamServer(socket_file, RequestHandler) as server:
+        server.state = state
+        log(f"Helper daemon listening on {socket_file}")
+        try:
+            server.serve_forever()
+        finally:
+            os.remove(socket_file)
+
+
+if __name__ == "__main__":
+    if "--stop" in sys.argv:
+        try:
+            print(send({"function": "shutdown"})["output"], end="")
+        except (FileNotFoundError, ConnectionRefusedError):
+            print("No helper daemon running")
+    else:
+        serve()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from .databricks_helper import (
+        find_parameters_for_sql_task,
+        get_job_index,
+        get_schema_prefix,
+        get_sql_file_identifier,
+        load_databricks_configuration,
+        load_job_catalogue,
+    )
+except ImportError:
+    from databricks_helper import (
+        find_parameters_for_sql_task,
+        get_job_index,
+        get_schema_prefix,
+        get_sql_file_identifier,
+        load_databricks_configuration,
+        load_job_catalogue,
+    )
+
+# Runs a helper operation for several regions or profiles at once in one process, sharing the
+# parsed databricks.yml, the job index and one workspace client per profile, and prints the
+# results as one report, e.g.
+#   ./databricks_fanout.py sql-file /workspace/calypso/data-pipelines/sql/x/y.sql --regions na eu
+#   ./databricks_fanout.py jobs --profiles default-na default-eu reporting --contains daily
+
+REGIONS = ["na", "eu"]
+
+
+def get_region_profile(region):
+    return f"default-{region}"
+
+
+def fan_out(function, targets, workers=None):
+    """
+    {target: function(target)} with the targets run concurrently. A target that fails has its
+    exception as its result so the others are still reported.
+    """
+    if not targets:
+        return {}
+    with ThreadPoolExecutor(max_workers=workers or len(targets)) as executor:
+        futures = {target: executor.submit(function, target) for target in targets}
+    results = {}
+    for target, future in futures.items():
+        try:
+            results[target] = future.result()
+        except Exception as e:
+            results[target] = e
+    return results
+
+
+def check_sql_file(sql_file, regions=REGIONS):
+    """
+    {region: {"identifier", parameters...}} for sql_file.
+    """
+    # Loaded once up front rather than by every thread
+    load_databricks_configuration()
+    get_schema_prefix()
+    index = get_job_index()
+
+    def check(region):
+        return {
+            "identifier": get_sql_file_identifier(region, sql_file, index),
+            **find_parameters_for_sql_task(region, sql_file, index),
+        }
+
+    return fan_out(check, regions)
+
+
+def list_job_names(profiles, contains="", refresh=False):
+    """
+    {profile: [job names]} from each profile's job catalogue.
+    """
+
+    def list_names(profile):
+        catalogue = load_job_catalogue(profile, refresh=refresh)
+        return sorted(name for name in catalogue["names"] if contains in name)
+
+    return fan_out(list_names, profiles)
+
+
+def print_report(results):
+    """
+    Merge per target results, dicts or lists, into one report: a key with the same value for every
+    target is printed once, otherwise with each target's value.
+    """
+    succeeded = {}
+    for target, result in results.items():
+        if isinstance(result, Exception):
+            print(f"{target}: failed, {result!r}")
+        else:
+            succeeded[target] = result
+
+    rows = {}
+    for target, result in succeeded.items():
+        items = result.items() if isinstance(result, dict) else ((item, True) for item in result)
+        for key, value in items:
+            rows.setdefault(key, {})[target] = value
+    for key, values in rows.items():
+        if len(values) == len(succeeded) and len(set(map(repr, values.values()))) == 1:
+            value = next(iter(values.values()))
+            print(key if value is True else f"{key}: {value}")
+        elif all(value is True for value in values.values()):
+            print(f"{key} (only {', '.join(values)})")
+        else:
+            print(f"{key}:")
+            for target in succeeded:
+                print(f"  {target}: {values.get(target, '-')}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="operation", required=True)
+    sql_file_parser = subparsers.add_parser("sql-file")
+    sql_file_parser.add_argument("sql_file")
+    sql_file_parser.add_argument("--regions", nargs="+", default=REGIONS)
+    jobs_parser = subparsers.add_parser("jobs")
+    jobs_parser.add_argument("--profiles", nargs="+")
+    jobs_parser.add_argument("--regions", nargs="+", default=REGIONS)
+    jobs_parser.add_argument("--contains", default="")
+    jobs_parser.add_argument("--refresh", action="store_true")
+    arguments = parser.parse_args()
+
+    if arguments.operation == "sql-file":
+        print_report(check_sql_file(arguments.sql_file, arguments.regions))
+    else:
+        profiles = arguments.profiles or [get_region_profile(region) for region in arguments.regions]
+        print_report(list_job_names(profiles, arguments.contains, arguments.refresh))
+
+
+if __name__ == "__main__":
+    main()
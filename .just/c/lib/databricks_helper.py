@@ -1,43 +1,166 @@
 # %%
 import json
 import os
+import re
+import string
+import threading
+import time
 from copy import deepcopy
 from functools import lru_cache
+from glob import glob
+from graphlib import TopologicalSorter
 
 import yaml
-from databricks.sdk import WorkspaceClient
+
+try:
+    from .tracing import span, traced
+    from .yaml_loading import load_yaml, load_yaml_files
+except ImportError:
+    from tracing import span, traced
+    from yaml_loading import load_yaml, load_yaml_files
 
 REPO_DIRECTORY = "/workspace/calypso/data-pipelines"
 RESOURCES_DIRECTORY = f"{REPO_DIRECTORY}/resources"
+SQL_DIRECTORY = f"{REPO_DIRECTORY}/sql"
 LEN_RESOURCES_DIRECTORY = len(RESOURCES_DIRECTORY)
 TEMP_JOB_DIRECTORY = os.path.join(RESOURCES_DIRECTORY, "_temp_")
 TARGET_PREFIX = "personal_dev"
 DATABRICKS_PROFILE = "default-na"
+CACHE_DIRECTORY = "/tmp/databricks-helper"
+JOB_INDEX_FILE = os.path.join(CACHE_DIRECTORY, "job-index.json")
+JOB_INDEX_VERSION = 2
+IDENTITY_CACHE_FILE = os.path.join(CACHE_DIRECTORY, "identity.json")
+IDENTITY_TTL_SECONDS = 24 * 60 * 60
+RENDERED_SQL_DIRECTORY = os.path.join(CACHE_DIRECTORY, "rendered")
+JOB_CATALOGUE_TTL_SECONDS = 15 * 60
+# Passes over the variables resolving references between them, e.g. a default of "${var.X}_y"
+BUNDLE_VARIABLE_PASSES = 5
+
+
+_workspace_client_locks = {}
 
 
 @lru_cache()
-def get_workspace_client(profile=DATABRICKS_PROFILE):
+@traced("sdk.get_workspace_client")
+def create_workspace_client(profile):
+    # Imported here as the SDK takes longer to import than most recipes take to run
+    from databricks.sdk import WorkspaceClient
+
     return WorkspaceClient(profile=profile)
 
 
+def get_workspace_client(profile=DATABRICKS_PROFILE):
+    # One client per profile even when several threads ask for it at once
+    with _workspace_client_locks.setdefault(profile, threading.Lock()):
+        return create_workspace_client(profile)
+
+
 def list_jobs(profile=DATABRICKS_PROFILE):
     workspace_client = get_workspace_client(profile=profile)
     return workspace_client.jobs.list()
 
 
+def get_job_catalogue_file(profile):
+    return os.path.join(CACHE_DIRECTORY, f"jobs-{profile}.json")
+
+
+def save_job_catalogue(profile, jobs):
+    names = {}
+    for job_id, job in sorted(jobs.items(), key=lambda item: item[1]["created_time"] or 0):
+        names[job["name"]] = job_id
+    catalogue = {"refreshed_at": time.time(), "jobs": jobs, "names": names}
+    write_json_atomically(get_job_catalogue_file(profile), catalogue)
+    return catalogue
+
+
+def get_job_entry(job):
+    return {"name": job.settings.name if job.settings else None, "created_time": job.created_time}
+
+
+def load_job_catalogue(profile=DATABRICKS_PROFILE, refresh=False):
+    """
+    Workspace jobs as {"jobs": {job_id: {"name", "created_time"}}, "names": {name: job_id}}, kept in
+    CACHE_DIRECTORY and re-listed once older than JOB_CATALOGUE_TTL_SECONDS. Where several jobs
+    share a name the most recently created one is indexed.
+    """
+    if not refresh:
+        try:
+            with open(get_job_catalogue_file(profile)) as file:
+                catalogue = json.load(file)
+            if time.time() - catalogue["refreshed_at"] < JOB_CATALOGUE_TTL_SECONDS:
+                return catalogue
+        except (OSError, ValueError, KeyError):
+            pass
+    with span("sdk.jobs.list"):
+        jobs = {str(job.job_id): get_job_entry(job) for job in list_jobs(profile)}
+    return save_job_catalogue(profile, jobs)
+
+
+def get_job_id(name, profile=DATABRICKS_PROFILE, refresh=False):
+    """
+    Id of the job called name from the catalogue. With refresh, or when the name isn't in the
+    catalogue (created since it was listed), just this name is listed again, so a job deleted and
+    redeployed under the same name gets its new id.
+    """
+    catalogue = load_job_catalogue(profile)
+    job_id = catalogue["names"].get(name)
+    if job_id is None or refresh:
+        with span("sdk.jobs.list"):
+            found = {
+                str(job.job_id): get_job_entry(job)
+                for job in get_workspace_client(profile).jobs.list(name=name)
+            }
+        jobs = {job_id: job for job_id, job in catalogue["jobs"].items() if job["name"] != name}
+        catalogue = save_job_catalogue(profile, {**jobs, **found})
+        job_id = catalogue["names"].get(name)
+    return job_id
+
+
+def print_job_names(profile=DATABRICKS_PROFILE, contains="", refresh=False):
+    catalogue = load_job_catalogue(profile, refresh=refresh)
+    for name in sorted(catalogue["names"]):
+        if contains in name:
+            print(name)
+
+
+@lru_cache()
+def get_current_user_name(profile=DATABRICKS_PROFILE):
+    """
+    (given_name, family_name) of the profile's user, persisted per profile to IDENTITY_CACHE_FILE so
+    warm runs within IDENTITY_TTL_SECONDS don't call current_user.me().
+    """
+    try:
+        with open(IDENTITY_CACHE_FILE) as file:
+            identities = json.load(file)
+    except (OSError, ValueError):
+        identities = {}
+    identity = identities.get(profile)
+    if identity and time.time() - identity["cached_at"] < IDENTITY_TTL_SECONDS:
+        return identity["given_name"], identity["family_name"]
+
+    with span("sdk.current_user.me"):
+        name = get_workspace_client(profile).current_user.me().name
+    identities[profile] = {
+        "given_name": name.given_name,
+        "family_name": name.family_name,
+        "cached_at": time.time(),
+    }
+    write_json_atomically(IDENTITY_CACHE_FILE, identities)
+    return name.given_name, name.family_name
+
+
 def get_schema_prefix(profile=DATABRICKS_PROFILE):
-    workspace_client = get_workspace_client(profile)
-    name = workspace_client.current_user.me().name
-    return f"{name.given_name[0]}_{name.family_name}_".lower()
+    given_name, family_name = get_current_user_name(profile)
+    return f"{given_name[0]}_{family_name}_".lower()
 
 
-next(list_jobs())
 # %%
 
 
 @lru_cache()
+@traced()
 def load_databricks_configuration():
-    return yaml.load(open(os.path.join(REPO_DIRECTORY, "databricks.yml")), Loader=yaml.SafeLoader)
+    return load_yaml(os.path.join(REPO_DIRECTORY, "databricks.yml"))
 
 
 def get_catalog_identifier(region):
@@ -47,50 +170,496 @@ def get_catalog_identifier(region):
     ]
 
 
-def yield_job_definitions():
+def get_variable_value(variable):
+    # Either a plain value or {"default": ...}, lookup variables have no value until deployed
+    if isinstance(variable, dict):
+        return variable.get("default")
+    return variable
+
+
+def format_variable_value(value):
+    # As the Databricks CLI writes it into a string, None for complex values it won't interpolate
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (str, int, float)):
+        return str(value)
+    return None
+
+
+def compile_bundle_references(values):
+    """
+    Function replacing every ${name} in a string with values[name] in a single pass, unknown
+    references are left as they are.
+    """
+    pattern = re.compile(
+        "|".join(re.escape(f"${{{name}}}") for name in sorted(values, key=len, reverse=True))
+    )
+
+    def resolve(value):
+        if not isinstance(value, str) or "${" not in value:
+            return value
+        return pattern.sub(lambda match: values[match[0][2:-1]], value)
+
+    return resolve
+
+
+@lru_cache()
+def get_bundle_resolver(region, profile=DATABRICKS_PROFILE):
+    """
+    Resolver for ${var.*} and ${bundle.*} references as the region's target would see them: the
+    bundle's variable defaults overridden by the target's, with ENV_SCHEMA_PREFIX being the personal
+    schema prefix of the profile's user.
+    """
+    configuration = load_databricks_configuration()
+    target = f"{TARGET_PREFIX}_{region}"
+    variables = {
+        **configuration.get("variables", {}),
+        **configuration["targets"][target].get("variables", {}),
+    }
+    values = {}
+    for name, variable in variables.items():
+        value = format_variable_value(get_variable_value(variable))
+        if value is not None:
+            values[f"var.{name}"] = value
+    values["var.ENV_SCHEMA_PREFIX"] = get_schema_prefix(profile)
+    values["bundle.target"] = target
+    if configuration.get("bundle", {}).get("name"):
+        values["bundle.name"] = configuration["bundle"]["name"]
+
+    resolve = compile_bundle_references(values)
+    for _ in range(BUNDLE_VARIABLE_PASSES):
+        resolved = {name: resolve(value) for name, value in values.items()}
+        if resolved == values:
+            break
+        values.update(resolved)
+    return resolve
+
+
+def yield_job_files():
     for path, _, files in os.walk(RESOURCES_DIRECTORY):
         for file in files:
             if file.endswith(".yml") and not path.endswith("_temp_"):
-                contents = yaml.load(open(os.path.join(path, file)), Loader=yaml.SafeLoader)
-                yield from contents["resources"]["jobs"].items()
+                yield os.path.join(path, file)
+
+
+def yield_job_definitions():
+    with span("yield_job_definitions"):
+        job_files = list(yield_job_files())
+        contents = load_yaml_files(job_files)
+    for file_contents in contents:
+        yield from file_contents["resources"]["jobs"].items()
+
+
+def get_sql_file_key(sql_file):
+    return sql_file.split("/sql/")[-1]
+
+
+def write_json_atomically(file_path, contents):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    temp_file_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_file_path, "w") as file:
+        json.dump(contents, file, default=str)
+    os.replace(temp_file_path, file_path)
+
+
+def index_job_definitions(contents):
+    jobs = contents.get("resources", {}).get("jobs", {})
+    sql_tasks = {}
+    for job_name, job in jobs.items():
+        for task_index, task in enumerate(job.get("tasks", [])):
+            if "sql_task" in task:
+                sql_file_key = get_sql_file_key(task["sql_task"]["file"]["path"])
+                sql_tasks.setdefault(sql_file_key, [job_name, task_index])
+    return {"jobs": jobs, "sql_tasks": sql_tasks}
+
+
+def get_task_id(job_name, task_key):
+    return f"{job_name}.{task_key}"
+
+
+def build_task_graph(files):
+    """
+    Every task of every job as {"tasks": {task id: {"location", "upstream", "downstream"}},
+    "sql_files": {sql file key: [task ids]}}, upstream / downstream being the direct depends_on
+    edges either way and a SQL file mapping to each task that runs it.
+    """
+    tasks = {}
+    sql_files = {}
+    for file_path, entry in files.items():
+        for job_name, job in entry["jobs"].items():
+            for task_index, task in enumerate(job.get("tasks", [])):
+                task_id = get_task_id(job_name, task["task_key"])
+                tasks[task_id] = {
+                    "location": [file_path, job_name, task_index],
+                    "upstream": [
+                        get_task_id(job_name, dependency["task_key"])
+                        for dependency in task.get("depends_on", [])
+                    ],
+                    "downstream": [],
+                }
+                if "sql_task" in task and "file" in task["sql_task"]:
+                    sql_file_key = get_sql_file_key(task["sql_task"]["file"]["path"])
+                    sql_files.setdefault(sql_file_key, []).append(task_id)
+    for task_id, node in tasks.items():
+        for upstream_id in node["upstream"]:
+            if upstream_id in tasks:
+                tasks[upstream_id]["downstream"].append(task_id)
+    return {"tasks": tasks, "sql_files": sql_files}
+
+
+@traced()
+def load_job_index():
+    """
+    Index of job definitions under RESOURCES_DIRECTORY, persisted to JOB_INDEX_FILE.
+
+    Only YAML files whose mtime or size changed since the last run are parsed again, the rest are
+    taken from the index as-is.
+    """
+    try:
+        with open(JOB_INDEX_FILE) as file:
+            index = json.load(file)
+        if index.get("version") != JOB_INDEX_VERSION or index.get("root") != RESOURCES_DIRECTORY:
+            index = None
+    except (OSError, ValueError):
+        index = None
+    previous_files = index["files"] if index else {}
+
+    files = {}
+    changed_files = {}
+    for file_path in yield_job_files():
+        stat = os.stat(file_path)
+        entry = previous_files.get(file_path)
+        if not entry or entry["mtime"] != stat.st_mtime_ns or entry["size"] != stat.st_size:
+            changed_files[file_path] = {"mtime": stat.st_mtime_ns, "size": stat.st_size}
+        files[file_path] = entry
+    for (file_path, entry), contents in zip(
+        changed_files.items(), load_yaml_files(changed_files.keys())
+    ):
+        files[file_path] = {**entry, **index_job_definitions(contents)}
+    changed = bool(changed_files) or files.keys() != previous_files.keys()
+
+    # With no index file and no job files nothing changed, but there is still no index to return
+    if not changed and index is not None:
+        return index
+
+    sql_tasks = {}
+    for file_path, entry in files.items():
+        for sql_file_key, (job_name, task_index) in entry["sql_tasks"].items():
+            sql_tasks.setdefault(sql_file_key, [file_path, job_name, task_index])
+
+    index = {
+        "version": JOB_INDEX_VERSION,
+        "root": RESOURCES_DIRECTORY,
+        "files": files,
+        "sql_tasks": sql_tasks,
+        "graph": build_task_graph(files),
+    }
+    write_json_atomically(JOB_INDEX_FILE, index)
+    return index
+
+
+_warm_job_index = None
+
+
+def use_warm_job_index(index):
+    """
+    Serve job lookups from index rather than checking the resources tree on every call, used by the
+    helper daemon which swaps in a fresh index whenever the tree changes.
+    """
+    global _warm_job_index
+    _warm_job_index = index
+
+
+def get_job_index():
+    return _warm_job_index or load_job_index()
+
 
+def find_sql_task_key(sql_file, index):
+    end_of_sql_file_path = get_sql_file_key(sql_file)
+    if end_of_sql_file_path in index["sql_tasks"]:
+        return end_of_sql_file_path
+    return next((key for key in index["sql_tasks"] if key.endswith(end_of_sql_file_path)), None)
 
-def find_job_with_sql_task(sql_file):
-    end_of_sql_file_path = sql_file.split("/sql/")[-1]
-    jobs = yield_job_definitions()
-    for job_name, job in jobs:
-        for task in job.get("tasks", []):
-            if "sql_task" in task and task["sql_task"]["file"]["path"].endswith(
-                end_of_sql_file_path
-            ):
-                return (job_name, job, task)
+
+def find_job_with_sql_task(sql_file, index=None):
+    index = index or get_job_index()
+    sql_file_key = find_sql_task_key(sql_file, index)
+    if sql_file_key is None:
+        return None
+    file_path, job_name, task_index = index["sql_tasks"][sql_file_key]
+    job = index["files"][file_path]["jobs"][job_name]
+    return (job_name, job, job["tasks"][task_index])
+
+
+def get_task(task_id, index):
+    file_path, job_name, task_index = index["graph"]["tasks"][task_id]["location"]
+    job = index["files"][file_path]["jobs"][job_name]
+    return (job_name, job, job["tasks"][task_index])
+
+
+def get_sql_file_task_ids(sql_file, index):
+    sql_file_key = find_sql_task_key(sql_file, index)
+    if sql_file_key is None:
+        raise SystemError(f"No job has a sql_task for {sql_file}")
+    return index["graph"]["sql_files"][sql_file_key]
+
+
+def get_reachable_task_ids(task_ids, direction, index):
+    # Tasks reachable from task_ids following direction ("upstream" or "downstream") edges
+    tasks = index["graph"]["tasks"]
+    reached = set()
+    stack = list(task_ids)
+    while stack:
+        for next_id in tasks[stack.pop()][direction]:
+            if next_id in tasks and next_id not in reached:
+                reached.add(next_id)
+                stack.append(next_id)
+    return reached
+
+
+def sort_task_ids(task_ids, index):
+    # Run order, each task after the tasks it depends on
+    tasks = index["graph"]["tasks"]
+    graph = {
+        task_id: [
+            upstream_id for upstream_id in tasks[task_id]["upstream"] if upstream_id in task_ids
+        ]
+        for task_id in task_ids
+    }
+    return list(TopologicalSorter(graph).static_order())
+
+
+def find_upstream_task_ids(sql_file, index=None):
+    """
+    (task id, upstream task ids in run order) for the smallest set of tasks that has to run before
+    sql_file's task. Where several tasks run the file the one needing the fewest is picked.
+    """
+    index = index or get_job_index()
+    candidates = [
+        (task_id, get_reachable_task_ids([task_id], "upstream", index))
+        for task_id in get_sql_file_task_ids(sql_file, index)
+    ]
+    task_id, upstream_ids = min(candidates, key=lambda candidate: len(candidate[1]))
+    return task_id, sort_task_ids(upstream_ids, index)
+
+
+def find_downstream_task_ids(sql_file, index=None):
+    """
+    Every task depending directly or indirectly on a task running sql_file, in run order.
+    """
+    index = index or get_job_index()
+    task_ids = get_sql_file_task_ids(sql_file, index)
+    return sort_task_ids(get_reachable_task_ids(task_ids, "downstream", index), index)
+
+
+def format_task(task_id, index):
+    _, _, task = get_task(task_id, index)
+    sql_file = task.get("sql_task", {}).get("file", {}).get("path")
+    return f"{task_id} ({get_sql_file_key(sql_file)})" if sql_file else task_id
+
+
+def print_upstream_tasks(sql_file):
+    index = get_job_index()
+    task_id, upstream_ids = find_upstream_task_ids(sql_file, index)
+    for upstream_id in upstream_ids:
+        print(format_task(upstream_id, index))
+    print(f"{len(upstream_ids)} tasks upstream of {task_id}")
+
+
+def print_downstream_tasks(sql_file):
+    index = get_job_index()
+    downstream_ids = find_downstream_task_ids(sql_file, index)
+    for downstream_id in downstream_ids:
+        print(format_task(downstream_id, index))
+    print(f"{len(downstream_ids)} tasks downstream of {sql_file}")
 
 
 def get_parameters_for_sql_task(region, job, task):
     parameters = {
         parameter["name"]: parameter["default"] for parameter in job.get("parameters", [])
     } | task["sql_task"].get("parameters", {})
-    return {
-        key: value.replace("${var.ENV_CATALOG_IDENTIFIER}", get_catalog_identifier(region)).replace(
-            "${var.ENV_SCHEMA_PREFIX}", get_schema_prefix()
-        )
-        for key, value in parameters.items()
-    }
+    resolve = get_bundle_resolver(region)
+    return {key: resolve(value) for key, value in parameters.items()}
+
+
+_resolved_sql_task_parameters = {}
 
 
-def find_parameters_for_sql_task(region, sql_file):
-    job_name, job, task = find_job_with_sql_task(sql_file)
-    return get_parameters_for_sql_task(region, job, task)
+def get_resolved_sql_task_parameters(region, index=None):
+    """
+    {sql file key: parameters} for every sql_task in the bundle resolved for region in one sweep,
+    memoised per region for as long as the same job index is in use.
+    """
+    index = index or get_job_index()
+    cached = _resolved_sql_task_parameters.get(region)
+    if cached is not None and cached[0] is index:
+        return cached[1]
+    parameters = {}
+    for sql_file_key, (file_path, job_name, task_index) in index["sql_tasks"].items():
+        job = index["files"][file_path]["jobs"][job_name]
+        task = job["tasks"][task_index]
+        parameters[sql_file_key] = get_parameters_for_sql_task(region, job, task)
+    _resolved_sql_task_parameters[region] = (index, parameters)
+    return parameters
+
+
+def find_parameters_for_sql_task(region, sql_file, index=None):
+    index = index or get_job_index()
+    sql_file_key = find_sql_task_key(sql_file, index)
+    if sql_file_key is None:
+        raise SystemError(f"No job has a sql_task for {sql_file}")
+    return dict(get_resolved_sql_task_parameters(region, index)[sql_file_key])
 
 
 def create_temp_job_for_sql_task(region, sql_file):
-    job_name, job, task = find_job_with_sql_task(sql_file)
-    parameters = get_parameters_for_sql_task(region, job, task)
-    task = deepcopy(task)
-    if "depends_on" in task:
-        del task["depends_on"]
-    task["sql_task"]["parameters"] = parameters
-    task
+    create_temp_job_for_sql_tasks(region, [sql_file])
+
+
+def create_temp_job_for_sql_tasks(region, sql_files):
+    """
+    One temp job holding the sql_task of each of sql_files, so a single bundle deploy covers them
+    all. depends_on edges between the selected tasks are kept, edges to other tasks are dropped.
+    """
+    index = get_job_index()
+    selected = []
+    for sql_file in sql_files:
+        found = find_job_with_sql_task(sql_file, index=index)
+        if found is None:
+            raise SystemError(f"No job has a sql_task for {sql_file}")
+        job_name, job, task = found
+        if any(job_name == name and task["task_key"] == t["task_key"] for name, _, t in selected):
+            continue
+        selected.append((job_name, job, task))
+    write_temp_job(region, selected)
+
+
+def create_temp_job_with_upstream(region, sql_file):
+    """
+    Temp job running sql_file's task after the minimal set of tasks upstream of it, so the data it
+    reads is refreshed first.
+    """
+    index = get_job_index()
+    task_id, upstream_ids = find_upstream_task_ids(sql_file, index)
+    write_temp_job(region, [get_task(task_id, index) for task_id in upstream_ids + [task_id]])
+
+
+# Job level definitions a task refers to by key: (job setting, key field)
+JOB_DEFINITIONS = [("job_clusters", "job_cluster_key"), ("environments", "environment_key")]
+JOB_PARAMETER_REFERENCE = re.compile(r"\{\{\s*job\.parameters\.([\w.-]+)\s*\}\}")
+
+
+def get_job_parameter_references(task):
+    return set(JOB_PARAMETER_REFERENCE.findall(json.dumps(task)))
+
+
+def rename_job_parameter_references(task, names):
+    # names is {old name: new name}, the names are word characters so need no JSON escaping
+    text = JOB_PARAMETER_REFERENCE.sub(
+        lambda match: f"{{{{job.parameters.{names.get(match[1], match[1])}}}}}", json.dumps(task)
+    )
+    return json.loads(text)
+
+
+def get_job_definitions(region, selected):
+    """
+    The job clusters, environments and job parameters of the source jobs that the (job_name, job,
+    task) tasks in selected need, as ({setting: [definitions]}, {(job_name, key field, key): key in
+    the temp job}). A key defined differently by two jobs is prefixed with the job name.
+
+    Only job parameters a non-SQL task reads through {{job.parameters.*}} are carried over, with
+    their defaults resolved for region. SQL tasks already have theirs resolved into their own
+    parameters, which a job parameter of the same name would override, so a parameter clashing
+    with one of those or with another job's default is renamed <job name>_<name>.
+    """
+    definitions = {setting: {} for setting, _ in JOB_DEFINITIONS}
+    keys = {}
+    for job_name, job, task in selected:
+        for setting, key_field in JOB_DEFINITIONS:
+            key = task.get(key_field)
+            if key is None or (job_name, key_field, key) in keys:
+                continue
+            definition = next((d for d in job.get(setting, []) if d[key_field] == key), None)
+            if definition is None:
+                raise SystemError(f"{job_name} has no {setting} entry for {key_field} {key}")
+            clashes = definitions[setting].get(key, definition) != definition
+            temp_key = f"{job_name}-{key}" if clashes else key
+            definitions[setting][temp_key] = {**deepcopy(definition), key_field: temp_key}
+            keys[(job_name, key_field, key)] = temp_key
+
+    sql_parameter_names = {
+        name
+        for _, job, task in selected
+        if "sql_task" in task
+        for name in get_parameters_for_sql_task(region, job, task)
+    }
+    resolve = get_bundle_resolver(region)
+    parameters = {}
+    for job_name, job, task in selected:
+        if "sql_task" in task:
+            continue
+        defaults = {
+            parameter["name"]: parameter.get("default") for parameter in job.get("parameters", [])
+        }
+        for name in sorted(get_job_parameter_references(task)):
+            if (job_name, "parameters", name) in keys or name not in defaults:
+                continue
+            value = resolve(defaults[name])
+            clashes = name in sql_parameter_names or parameters.get(name, value) != value
+            temp_name = re.sub(r"\W", "_", f"{job_name}_{name}") if clashes else name
+            parameters[temp_name] = value
+            keys[(job_name, "parameters", name)] = temp_name
+
+    settings = {setting: list(values.values()) for setting, values in definitions.items() if values}
+    if parameters:
+        settings["parameters"] = [
+            {"name": name, "default": value} for name, value in parameters.items()
+        ]
+    return settings, keys
+
+
+def write_temp_job(region, selected):
+    """
+    Write the (job_name, job, task) tasks in selected as the temp job, depends_on edges between
+    them are kept and edges to other tasks dropped. Job clusters, environments and job parameters
+    the tasks use are copied from their source jobs, see get_job_definitions.
+    """
+    # Task keys only have to be unique within a job, prefix with the job name where they clash
+    key_counts = {}
+    for _, _, task in selected:
+        key_counts[task["task_key"]] = key_counts.get(task["task_key"], 0) + 1
+    task_keys = {
+        (job_name, task["task_key"]): task["task_key"]
+        if key_counts[task["task_key"]] == 1
+        else f"{job_name}-{task['task_key']}"
+        for job_name, _, task in selected
+    }
+
+    settings, keys = get_job_definitions(region, selected)
+    tasks = []
+    for job_name, job, task in selected:
+        parameters = get_parameters_for_sql_task(region, job, task) if "sql_task" in task else None
+        task = deepcopy(task)
+        task["task_key"] = task_keys[(job_name, task["task_key"])]
+        depends_on = [
+            {**dependency, "task_key": task_keys[(job_name, dependency["task_key"])]}
+            for dependency in task.pop("depends_on", [])
+            if (job_name, dependency["task_key"]) in task_keys
+        ]
+        if depends_on:
+            task["depends_on"] = depends_on
+        if parameters is not None:
+            task["sql_task"]["parameters"] = parameters
+        for _, key_field in JOB_DEFINITIONS:
+            if key_field in task:
+                task[key_field] = keys[(job_name, key_field, task[key_field])]
+        renamed = {
+            name: keys[(job_name, "parameters", name)]
+            for name in get_job_parameter_references(task)
+            if keys.get((job_name, "parameters", name), name) != name
+        }
+        if renamed:
+            task = rename_job_parameter_references(task, renamed)
+        tasks.append(task)
 
     structure = {
         "resources": {
@@ -103,7 +672,8 @@ def create_temp_job_for_sql_task(region, sql_file):
                             "level": "CAN_MANAGE_RUN",
                         }
                     ],
-                    "tasks": [task],
+                    "tasks": tasks,
+                    **settings,
                 }
             }
         }
@@ -121,37 +691,124 @@ def create_temp_job_for_sql_task(region, sql_file):
     print(f"Job definition saved to {output_file}")
 
 
-def inject_parameters_into_sql_file(region, sql_file):
-    parameters = find_parameters_for_sql_task(region, sql_file)
+_formatter = string.Formatter()
+_compiled_sql_templates = {}
+
 
-    output = ["%sql\n"]
-    with open(os.path.join(RESOURCES_DIRECTORY, sql_file)) as file:
-        while line := file.readline():
+def compile_sql_template(file_path):
+    """
+    Split the injected version of a SQL file into literal strings and (field_name, format_spec,
+    conversion) placeholders, {{name}} becomes a quoted '{name}' placeholder.
+    """
+    segments = ["%sql\n"]
+    with open(file_path) as file:
+        for line in file:
             if "{{" in line:
-                new_line = (
-                    line.replace("\n", "")
-                    .replace("{{", "'{")
-                    .replace("}}", "}'")
-                    .format(**parameters)
-                )
-                output.append(f"-- [ORIGINAL] {line}")
-                output.append(f"{new_line} -- [REPLACEMENT]\n")
+                segments.append(f"-- [ORIGINAL] {line}")
+                template = line.replace("\n", "").replace("{{", "'{").replace("}}", "}'")
+                for literal, field_name, format_spec, conversion in _formatter.parse(template):
+                    segments.append(literal)
+                    if field_name is not None:
+                        segments.append((field_name, format_spec, conversion))
+                segments.append(" -- [REPLACEMENT]\n")
             elif "CREATE OR REPLACE" in line:
-                output.append(f"-- [ORIGINAL] {line}")
+                segments.append(f"-- [ORIGINAL] {line}")
             else:
-                output.append(f"{line}")
+                segments.append(line)
+
+    compiled = []
+    for segment in segments:
+        if isinstance(segment, str) and compiled and isinstance(compiled[-1], str):
+            compiled[-1] += segment
+        elif segment != "":
+            compiled.append(segment)
+    return compiled
+
+
+def get_compiled_sql_template(file_path):
+    stat = os.stat(file_path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = _compiled_sql_templates.get(file_path)
+    if cached is None or cached[0] != key:
+        cached = (key, compile_sql_template(file_path))
+        _compiled_sql_templates[file_path] = cached
+    return cached[1]
+
+
+def render_sql_template(compiled, parameters):
+    output = []
+    for segment in compiled:
+        if isinstance(segment, str):
+            output.append(segment)
+            continue
+        field_name, format_spec, conversion = segment
+        value, _ = _formatter.get_field(field_name, (), parameters)
+        value = _formatter.convert_field(value, conversion)
+        if "{" in format_spec:
+            format_spec = _formatter.vformat(format_spec, (), parameters)
+        output.append(_formatter.format_field(value, format_spec))
+    return "".join(output)
 
-    print("".join(output))
 
-
-def get_identifier_from_sql_file(region, sql_file):
+def inject_parameters_into_sql_file(region, sql_file):
     parameters = find_parameters_for_sql_task(region, sql_file)
+    compiled = get_compiled_sql_template(os.path.join(RESOURCES_DIRECTORY, sql_file))
+    print(render_sql_template(compiled, parameters))
+
+
+def inject_parameters_into_sql_files(
+    regions, pattern="**/*.sql", output_directory=RENDERED_SQL_DIRECTORY
+):
+    """
+    Render every SQL file under SQL_DIRECTORY matching pattern for each region in one process,
+    written to output_directory/<region>/<path relative to SQL_DIRECTORY>.
+    """
+    index = get_job_index()
+    parameters_by_region = {
+        region: get_resolved_sql_task_parameters(region, index) for region in regions
+    }
+    sql_files = sorted(glob(os.path.join(SQL_DIRECTORY, pattern), recursive=True))
+    written = 0
+    for sql_file in sql_files:
+        sql_file_key = find_sql_task_key(sql_file, index)
+        if sql_file_key is None:
+            print(f"Skipped {sql_file}, no job has a sql_task for it")
+            continue
+        try:
+            compiled = get_compiled_sql_template(sql_file)
+        except (OSError, ValueError) as e:
+            print(f"Skipped {sql_file}, failed to compile: {e!r}")
+            continue
+        for region in regions:
+            parameters = parameters_by_region[region][sql_file_key]
+            output_file = os.path.join(
+                output_directory, region, os.path.relpath(sql_file, SQL_DIRECTORY)
+            )
+            try:
+                rendered = render_sql_template(compiled, parameters)
+            except (KeyError, IndexError, ValueError) as e:
+                print(f"Skipped {sql_file} for {region}, failed to render: {e!r}")
+                continue
+            os.makedirs(os.path.dirname(output_file), exist_ok=True)
+            with open(output_file, "w") as file:
+                file.write(rendered)
+            written += 1
     print(
-        ".".join(
-            [
-                parameters.get("output_catalog_name", "?"),
-                parameters.get("output_schema_name", "?"),
-                os.path.split(sql_file)[-1][:-4],
-            ]
-        )
+        f"Rendered {written} SQL files ({len(sql_files)} found x {len(regions)} regions) for"
+        f" {', '.join(regions)} to {output_directory}"
+    )
+
+
+def get_sql_file_identifier(region, sql_file, index=None):
+    parameters = find_parameters_for_sql_task(region, sql_file, index=index)
+    return ".".join(
+        [
+            parameters.get("output_catalog_name", "?"),
+            parameters.get("output_schema_name", "?"),
+            os.path.split(sql_file)[-1][:-4],
+        ]
     )
+
+
+def get_identifier_from_sql_file(region, sql_file):
+    print(get_sql_file_identifier(region, sql_file))
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+import argparse
+import csv
+import json
+import os
+import time
+from urllib.request import Request, urlopen
+
+try:
+    from .databricks_helper import DATABRICKS_PROFILE, get_workspace_client
+except ImportError:
+    from databricks_helper import DATABRICKS_PROFILE, get_workspace_client
+
+# Runs SQL statements through the statement execution API, polling with a growing interval rather
+# than a fixed sleep and streaming each result chunk to disk as it is fetched
+# e.g. ./databricks_statements.py --profile default-na --warehouse-id 0df16878fb746ed5 "SELECT 1" "SELECT 2"
+
+STATEMENTS_PATH = "/api/2.0/sql/statements"
+# Server side wait before the first response, quick statements come back finished without polling.
+# Only the last statement waits, the others return at once so all of them are running together
+WAIT_TIMEOUT = "5s"
+NO_WAIT_TIMEOUT = "0s"
+POLL_INITIAL_SECONDS = 0.5
+POLL_MAX_SECONDS = 10.0
+POLL_BACKOFF = 1.5
+PENDING_STATES = {"PENDING", "RUNNING"}
+
+
+def submit_statement(
+    api_client, warehouse_id, statement, disposition="INLINE", wait_timeout=WAIT_TIMEOUT
+):
+    return api_client.do(
+        "POST",
+        STATEMENTS_PATH,
+        body={
+            "warehouse_id": warehouse_id,
+            "statement": statement,
+            "wait_timeout": wait_timeout,
+            "on_wait_timeout": "CONTINUE",
+            "disposition": disposition,
+            "format": "JSON_ARRAY",
+        },
+    )
+
+
+def get_statement(api_client, statement_id):
+    return api_client.do("GET", f"{STATEMENTS_PATH}/{statement_id}")
+
+
+def get_result_chunk(api_client, statement_id, chunk_index):
+    return api_client.do("GET", f"{STATEMENTS_PATH}/{statement_id}/result/chunks/{chunk_index}")
+
+
+def yield_chunk_rows(chunk):
+    yield from chunk.get("data_array") or []
+    # EXTERNAL_LINKS disposition, links are pre-signed so no auth header is sent, only the headers
+    # the API lists with each link
+    for link in chunk.get("external_links") or []:
+        request = Request(link["external_link"], headers=link.get("http_headers") or {})
+        with urlopen(request, timeout=60) as response:
+            yield from json.load(response)
+
+
+def get_next_chunk_index(chunk):
+    # Set on the chunk itself for INLINE results, on each of its links for EXTERNAL_LINKS
+    if chunk.get("next_chunk_index") is not None:
+        return chunk["next_chunk_index"]
+    links = chunk.get("external_links") or []
+    return links[-1].get("next_chunk_index") if links else None
+
+
+def yield_result_rows(api_client, response):
+    """
+    Rows of a finished statement, one chunk at a time.
+    """
+    chunk = response.get("result") or {}
+    while True:
+        yield from yield_chunk_rows(chunk)
+        next_chunk_index = get_next_chunk_index(chunk)
+        if next_chunk_index is None:
+            return
+        chunk = get_result_chunk(api_client, response["statement_id"], next_chunk_index)
+
+
+class ResultWriter:
+    def __init__(self, output_file, columns, output_format):
+        self.file = open(output_file, "w", newline="")
+        self.columns = columns
+        self.output_format = output_format
+        if output_format == "csv":
+            self.csv_writer = csv.writer(self.file)
+            self.csv_writer.writerow(columns)
+
+    def write(self, row):
+        if self.output_format == "csv":
+            self.csv_writer.writerow(row)
+        else:
+            self.file.write(json.dumps(dict(zip(self.columns, row))) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+def write_result(api_client, response, output_directory, output_format):
+    columns = [
+        column["name"] for column in response.get("manifest", {}).get("schema", {}).get("columns", [])
+    ]
+    output_file = os.path.join(output_directory, f"{response['statement_id']}.{output_format}")
+    writer = ResultWriter(output_file, columns, output_format)
+    rows = 0
+    try:
+        for row in yield_result_rows(api_client, response):
+            writer.write(row)
+            rows += 1
+    finally:
+        writer.close()
+    return output_file, rows
+
+
+def handle_finished_statement(api_client, response, output_directory, output_format):
+    state = response["status"]["state"]
+    print(f"Statement {response['statement_id']}: {state}")
+    if state == "SUCCEEDED":
+        output_file, rows = write_result(api_client, response, output_directory, output_format)
+        print(f"  {rows} rows written to {output_file}")
+    else:
+        print(f"  {json.dumps(response['status'].get('error', {}))}")
+
+
+def run_statements(
+    statements,
+    warehouse_id,
+    profile=DATABRICKS_PROFILE,
+    api_client=None,
+    output_directory=".",
+    output_format="ndjson",
+    disposition="INLINE",
+):
+    """
+    Submit all statements up front, poll the unfinished ones each on its own backoff schedule and
+    write each result once every statement has been submitted and its statement has finished.
+    Returns the final responses in order.
+    """
+    api_client = api_client or get_workspace_client(profile).api_client
+    os.makedirs(output_directory, exist_ok=True)
+
+    responses = []
+    # statement index -> (next poll time, current interval)
+    polls = {}
+    finished = []
+    for index, statement in enumerate(statements):
+        wait_timeout = WAIT_TIMEOUT if index == len(statements) - 1 else NO_WAIT_TIMEOUT
+        response = submit_statement(api_client, warehouse_id, statement, disposition, wait_timeout)
+        responses.append(response)
+        if response["status"]["state"] in PENDING_STATES:
+            polls[index] = (time.monotonic() + POLL_INITIAL_SECONDS, POLL_INITIAL_SECONDS)
+        else:
+            finished.append(response)
+    # Fetching results waits until now so it doesn't hold back submitting the rest
+    for response in finished:
+        handle_finished_statement(api_client, response, output_directory, output_format)
+
+    while polls:
+        index, (next_poll, interval) = min(polls.items(), key=lambda item: item[1][0])
+        time.sleep(max(0.0, next_poll - time.monotonic()))
+        response = responses[index] = get_statement(api_client, responses[index]["statement_id"])
+        if response["status"]["state"] in PENDING_STATES:
+            interval = min(interval * POLL_BACKOFF, POLL_MAX_SECONDS)
+            polls[index] = (time.monotonic() + interval, interval)
+        else:
+            del polls[index]
+            handle_finished_statement(api_client, response, output_directory, output_format)
+    return responses
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("statements", nargs="+")
+    parser.add_argument("--warehouse-id", required=True)
+    parser.add_argument("--profile", default=DATABRICKS_PROFILE)
+    parser.add_argument("--output-directory", default=".")
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--disposition", choices=["INLINE", "EXTERNAL_LINKS"], default="INLINE")
+    # Host and token instead of a profile, e.g. to run against a local fake of the statements API
+    parser.add_argument("--host")
+    parser.add_argument("--token", default=os.environ.get("DATABRICKS_TOKEN"))
+    arguments = parser.parse_args()
+    api_client = None
+    if arguments.host:
+        from databricks.sdk import WorkspaceClient
+
+        api_client = WorkspaceClient(host=arguments.host, token=arguments.token).api_client
+    run_statements(
+        arguments.statements,
+        arguments.warehouse_id,
+        profile=arguments.profile,
+        api_client=api_client,
+        output_directory=arguments.output_directory,
+        output_format=arguments.format,
+        disposition=arguments.disposition,
+    )
+
+
+if __name__ == "__main__":
+    main()
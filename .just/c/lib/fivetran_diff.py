@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+import argparse
+import hashlib
+import json
+from collections import Counter
+from os import getpid, path, replace
+
+try:
+    from .fivetran_index import get_connector_files, load_connector
+except ImportError:
+    from fivetran_index import get_connector_files, load_connector
+
+# What changed between two fivetran_helper.dump snapshots (per-file or bulk), e.g.
+#   cp -r /workspace/fivetran /workspace/fivetran-before && just fivetran-dump
+#   ./fivetran_diff.py /workspace/fivetran-before /workspace/fivetran
+#
+# Every schema / table / column is hashed over the fields reported on plus its children's hashes,
+# so comparing only descends into subtrees whose hash differs. Each connector's top hash is kept in
+# HASH_FILE next to the dump keyed on the file's stamp, unchanged connectors are never re-read.
+
+HASH_FILE = ".snapshot-hashes.json"
+TRACKED_FIELDS = ("enabled", "name_in_destination")
+# (level name, key holding the next level down) from the top of a connector's schema tree
+LEVELS = [("schema", "tables"), ("table", "columns"), ("column", None)]
+
+
+def get_schemas(connector):
+    schemas = connector.get("schemas")
+    return (schemas.get("schemas") or {}) if isinstance(schemas, dict) else {}
+
+
+def get_label(connector):
+    return f"{connector['schema']} ({connector['service']})"
+
+
+def hash_node(fields, children):
+    digest = hashlib.sha256(json.dumps(fields, sort_keys=True).encode())
+    for name in sorted(children):
+        digest.update(f"\0{name}\0{children[name]['hash']}".encode())
+    return digest.hexdigest()
+
+
+def build_tree(items, depth=0):
+    """
+    {name: {"hash", "fields", "children"}} for one level of a schema tree and everything below it.
+    """
+    _, child_key = LEVELS[depth]
+    tree = {}
+    for name, item in items.items():
+        fields = {field: item.get(field) for field in TRACKED_FIELDS}
+        children = build_tree(item.get(child_key) or {}, depth + 1) if child_key else {}
+        tree[name] = {"hash": hash_node(fields, children), "fields": fields, "children": children}
+    return tree
+
+
+def load_hashes(output_directory):
+    try:
+        with open(path.join(output_directory, HASH_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_hashes(output_directory, hashes):
+    hash_file = path.join(output_directory, HASH_FILE)
+    temp_file = f"{hash_file}.{getpid()}.tmp"
+    with open(temp_file, "w") as f:
+        json.dump(hashes, f)
+    replace(temp_file, hash_file)
+
+
+def load_snapshot(output_directory):
+    """
+    ({connector id: entry}, bulk index) for a dump, each entry holding the connector's file name,
+    label and top hash. Connectors are only read and hashed when their stamp has changed.
+    """
+    current, bulk_index = get_connector_files(output_directory)
+    cached = load_hashes(output_directory)
+    hashes = {}
+    for name, stamp in current.items():
+        entry = cached.get(name)
+        if entry is None or tuple(entry["stamp"]) != stamp:
+            connector = load_connector(output_directory, name, bulk_index)
+            entry = {
+                "stamp": list(stamp),
+                "id": connector["id"],
+                "label": get_label(connector),
+                "hash": hash_node({}, build_tree(get_schemas(connector))),
+            }
+        hashes[name] = entry
+    if hashes != cached:
+        save_hashes(output_directory, hashes)
+    snapshot = {}
+    for name, entry in hashes.items():
+        if entry["id"] in snapshot:
+            raise SystemError(
+                f"Connector {entry['id']} is in both {snapshot[entry['id']]['name']} and {name}"
+            )
+        snapshot[entry["id"]] = {**entry, "name": name}
+    return snapshot, bulk_index
+
+
+def diff_trees(old, new, parents=()):
+    """
+    (change, level, path, old value, new value) for each difference, skipping equal subtrees.
+    """
+    if not old and not new:
+        return
+    level, _ = LEVELS[len(parents)]
+    for name in sorted(old.keys() | new.keys()):
+        node_path = parents + (name,)
+        old_node, new_node = old.get(name), new.get(name)
+        if old_node is None:
+            yield "added", level, node_path, None, new_node["fields"]["name_in_destination"]
+        elif new_node is None:
+            yield "removed", level, node_path, old_node["fields"]["name_in_destination"], None
+        elif old_node["hash"] != new_node["hash"]:
+            old_fields, new_fields = old_node["fields"], new_node["fields"]
+            if old_fields["enabled"] != new_fields["enabled"]:
+                change = "enabled" if new_fields["enabled"] else "disabled"
+                yield change, level, node_path, old_fields["enabled"], new_fields["enabled"]
+            if old_fields["name_in_destination"] != new_fields["name_in_destination"]:
+                yield (
+                    "renamed",
+                    level,
+                    node_path,
+                    old_fields["name_in_destination"],
+                    new_fields["name_in_destination"],
+                )
+            yield from diff_trees(old_node["children"], new_node["children"], node_path)
+
+
+def diff_snapshots(old_directory, new_directory):
+    """
+    (connector label, change, level, path, old value, new value) for everything that differs
+    between two dumps, connectors are matched on id.
+    """
+    old, old_bulk_index = load_snapshot(old_directory)
+    new, new_bulk_index = load_snapshot(new_directory)
+    for connector_id in sorted(old.keys() | new.keys()):
+        old_entry, new_entry = old.get(connector_id), new.get(connector_id)
+        if old_entry is None:
+            yield new_entry["label"], "added", "connector", (), None, connector_id
+        elif new_entry is None:
+            yield old_entry["label"], "removed", "connector", (), connector_id, None
+        elif old_entry["hash"] != new_entry["hash"]:
+            old_connector = load_connector(old_directory, old_entry["name"], old_bulk_index)
+            new_connector = load_connector(new_directory, new_entry["name"], new_bulk_index)
+            for change in diff_trees(
+                build_tree(get_schemas(old_connector)), build_tree(get_schemas(new_connector))
+            ):
+                yield (new_entry["label"], *change)
+
+
+def format_change(label, change, level, node_path, old_value, new_value):
+    line = f"{label} {level} {'.'.join(node_path) or (old_value or new_value)}: {change}"
+    if change == "renamed":
+        return f"{line} {old_value} -> {new_value}"
+    return line
+
+
+def print_snapshot_diff(old_directory, new_directory):
+    counts = Counter()
+    for label, change, level, node_path, old_value, new_value in diff_snapshots(
+        old_directory, new_directory
+    ):
+        counts[f"{level}s {change}"] += 1
+        print(format_change(label, change, level, node_path, old_value, new_value))
+    print(", ".join(f"{count} {key}" for key, count in sorted(counts.items())) or "No changes")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("old_directory")
+    parser.add_argument("new_directory")
+    arguments = parser.parse_args()
+    print_snapshot_diff(arguments.old_directory, arguments.new_directory)
+
+
+if __name__ == "__main__":
+    main()
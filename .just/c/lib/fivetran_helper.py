@@ -1,9 +1,27 @@
 # %%
+import gzip
+import hashlib
 import json
-from os import environ, path
+import random
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+from email.utils import parsedate_to_datetime
+from functools import partial
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+from os import environ, getpid, makedirs, path, remove, replace
 from pathlib import Path
-from urllib import error
-from urllib.request import Request, urlopen
+from urllib.parse import urlencode, urlsplit
+
+try:
+    from .tracing import span, traced
+except ImportError:
+    from tracing import span, traced
 
 # Skipped for now
 # https://api.fivetran.com/v1/metadata/connector-types/google_ads
@@ -11,33 +29,352 @@ from urllib.request import Request, urlopen
 # https://api.fivetran.com/v1/metadata/connector-types
 
 
+FIVETRAN_API_URL = environ.get("FIVETRAN_API_URL", "https://api.fivetran.com/v1")
+DEFAULT_WORKERS = 8
+DEFAULT_PAGE_LIMIT = 100
+REQUESTS_PER_SECOND = float(environ.get("FIVETRAN_REQUESTS_PER_SECOND", "10"))
+REQUEST_BURST = 10
+MAX_RETRIES = 6
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_CAP_SECONDS = 60.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MANIFEST_FILE = ".manifest.json"
+CACHE_FILE = environ.get("FIVETRAN_CACHE_FILE", "/tmp/fivetran-helper/response-cache.sqlite")
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Summing the table's sizes is a full scan, so the size limit is checked every this many puts
+CACHE_EVICT_EVERY_PUTS = 100
+DEFAULT_CACHE_TTL_SECONDS = 300
+# First matching URI pattern sets how long a cached response stays fresh
+CACHE_TTL_SECONDS = [
+    (re.compile(r"^connectors/[^/?]+/schemas"), 3600),
+    (re.compile(r"^connectors/[^/?]+/state"), 60),
+    (re.compile(r"^connectors(\?|$)"), 900),
+    (re.compile(r"^destinations"), 3600),
+]
+# Connector fields that move when a sync or schema change has happened, if none of them differ from
+# the previous incremental dump the schema is taken from the previous output instead of the API.
+# Edits made in the Fivetran UI (enabling a table, renaming a column) don't move them until the next
+# sync, so a reused schema is fetched again anyway once it is older than SCHEMA_MAX_AGE_SECONDS
+SCHEMA_FINGERPRINT_FIELDS = ("schema", "service", "succeeded_at", "failed_at", "paused")
+SCHEMA_MAX_AGE_SECONDS = int(environ.get("FIVETRAN_SCHEMA_MAX_AGE_SECONDS", 6 * 3600))
+# "files" writes one pretty printed JSON file per record, "bulk" appends them all to BULK_FILE, or
+# STATE_BULK_FILE for dump_state so it can share an output directory with dump
+OUTPUT_FORMATS = ("files", "bulk")
+BULK_FILE = "dump.ndjson.gz"
+STATE_BULK_FILE = "state.ndjson.gz"
+BULK_COMPRESS_LEVEL = 6
+
+# One keep-alive connection per thread, reused across requests
+_connections = threading.local()
+
+
+def get_connection():
+    connection = getattr(_connections, "connection", None)
+    if connection is None:
+        api_url = urlsplit(FIVETRAN_API_URL)
+        connection_class = HTTPSConnection if api_url.scheme == "https" else HTTPConnection
+        connection = connection_class(api_url.netloc, timeout=30)
+        _connections.connection = connection
+    return connection
+
+
+def close_connection():
+    connection = getattr(_connections, "connection", None)
+    if connection is not None:
+        connection.close()
+        _connections.connection = None
+
+
+def get_request_target(url):
+    parts = urlsplit(url)
+    return f"{parts.path}?{parts.query}" if parts.query else parts.path
+
+
+def request(method, url, headers):
+    # A pooled connection may have been dropped by the server while idle, retry once on a new one
+    for attempt in range(2):
+        connection = get_connection()
+        try:
+            connection.request(method, url, headers=headers)
+            response = connection.getresponse()
+            return response, response.read()
+        except (HTTPException, ConnectionError):
+            close_connection()
+            if attempt:
+                raise
+
+
+def get_retry_after(response):
+    retry_after = response.getheader("Retry-After")
+    if retry_after is None:
+        return None
+    try:
+        return max(float(retry_after), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RequestScheduler:
+    """
+    Gatekeeper for all API requests, shared between worker threads.
+
+    A token bucket caps the request rate, throttled (429) and transient (5xx / connection) failures
+    are retried with exponential backoff and full jitter, and a Retry-After from the server pauses
+    every thread, not just the one that received it.
+    """
+
+    def __init__(
+        self,
+        rate=REQUESTS_PER_SECOND,
+        burst=REQUEST_BURST,
+        max_retries=MAX_RETRIES,
+        backoff_base=BACKOFF_BASE_SECONDS,
+        backoff_cap=BACKOFF_CAP_SECONDS,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                wait = self.paused_until - now
+                if wait <= 0 and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                if wait <= 0:
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def get_backoff(self, attempt):
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2**attempt))
+
+    def send(self, method, url, headers):
+        for attempt in range(self.max_retries + 1):
+            self.acquire()
+            try:
+                response, body = request(method, url, headers)
+            except (HTTPException, OSError) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.get_backoff(attempt)
+                print(f"{method} {url} failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            if response.status not in RETRY_STATUSES or attempt == self.max_retries:
+                return response, body
+            delay = get_retry_after(response)
+            if delay is None:
+                delay = self.get_backoff(attempt)
+            else:
+                self.pause(delay)
+            print(f"{method} {url} returned HTTP {response.status}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+scheduler = RequestScheduler()
+
+
+def get_cache_ttl(uri):
+    return next(
+        (ttl for pattern, ttl in CACHE_TTL_SECONDS if pattern.search(uri)), DEFAULT_CACHE_TTL_SECONDS
+    )
+
+
+class ResponseCache:
+    """
+    Opt-in on-disk cache of api_get responses keyed by URI.
+
+    Entries expire after a per-endpoint TTL (CACHE_TTL_SECONDS) and the least recently used ones are
+    evicted once the cache grows past max_bytes, checked every CACHE_EVICT_EVERY_PUTS puts. With
+    refresh set, cached entries are ignored but the fresh responses are still stored.
+    """
+
+    def __init__(self, cache_file=CACHE_FILE, max_bytes=CACHE_MAX_BYTES, enabled=False, refresh=False):
+        self.cache_file = cache_file
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.refresh = refresh
+        self.local = threading.local()
+        self.puts = 0
+        self.puts_lock = threading.Lock()
+
+    def get_database(self):
+        database = getattr(self.local, "database", None)
+        if database is None:
+            makedirs(path.dirname(self.cache_file), exist_ok=True)
+            database = sqlite3.connect(self.cache_file, timeout=30, isolation_level=None)
+            database.execute("PRAGMA journal_mode=WAL")
+            database.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(uri TEXT PRIMARY KEY, data TEXT, stored_at REAL, accessed_at REAL, size INTEGER)"
+            )
+            database.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (accessed_at)")
+            self.local.database = database
+        return database
+
+    def get(self, uri):
+        if not self.enabled or self.refresh:
+            return None
+        database = self.get_database()
+        row = database.execute(
+            "SELECT data, stored_at FROM responses WHERE uri = ?", (uri,)
+        ).fetchone()
+        if row is None or time.time() - row[1] > get_cache_ttl(uri):
+            return None
+        database.execute("UPDATE responses SET accessed_at = ? WHERE uri = ?", (time.time(), uri))
+        return json.loads(row[0])
+
+    def put(self, uri, data):
+        if not self.enabled:
+            return
+        database = self.get_database()
+        contents = json.dumps(data)
+        now = time.time()
+        database.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+            (uri, contents, now, now, len(contents)),
+        )
+        with self.puts_lock:
+            self.puts += 1
+            check = self.puts % CACHE_EVICT_EVERY_PUTS == 1
+        if check:
+            self.evict()
+
+    def evict(self):
+        database = self.get_database()
+        (total,) = database.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if total <= self.max_bytes:
+            return
+        for uri, size in database.execute(
+            "SELECT uri, size FROM responses ORDER BY accessed_at"
+        ).fetchall():
+            database.execute("DELETE FROM responses WHERE uri = ?", (uri,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        self.get_database().execute("DELETE FROM responses")
+
+
+response_cache = ResponseCache(enabled=environ.get("FIVETRAN_CACHE") == "1")
+
+
+def use_cache(refresh=False):
+    response_cache.enabled = True
+    response_cache.refresh = refresh
+
+
+@contextmanager
+def fresh_responses():
+    """
+    Ignore cached responses for the duration, for dumps which have to reflect the account as it is
+    now (and which the incremental manifest records as current). Fresh responses are still cached.
+    """
+    previous = response_cache.refresh
+    response_cache.refresh = True
+    try:
+        yield
+    finally:
+        response_cache.refresh = previous
+
+
+@traced()
 def api_get(uri):
-    url = f"https://api.fivetran.com/v1/{uri}"
+    url = f"{FIVETRAN_API_URL}/{uri}"
+    data = response_cache.get(uri)
+    if data is not None:
+        print(f"GET {url} (cached)")
+        return data
     credentials = environ.get("FTA")
     print(f"GET {url}")
-    try:
-        with urlopen(
-            Request(
-                url=url,
-                headers={
-                    "Content-Type": "application/json",
-                    "Authorization": f"Basic {credentials}",
-                },
-                method="GET",
-            ),
-            timeout=30,
-        ) as response:
-            contents = json.loads(response.read().decode())
-            if contents.get("next_cursor"):
-                raise SystemError("Pagination not implemented yet but we received a next_cursor")
-            return contents["data"]
-    except error.HTTPError as e:
-        print(e)
+    with span("api_get.request"):
+        response, body = scheduler.send(
+            "GET",
+            get_request_target(url),
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Basic {credentials}",
+            },
+        )
+    if response.status in RETRY_STATUSES:
+        raise SystemError(
+            f"GET {url} still failing with HTTP {response.status} after {scheduler.max_retries} retries"
+        )
+    if response.status >= 400:
+        print(f"HTTP Error {response.status}: {response.reason}")
         return None
+    contents = json.loads(body.decode())
+    response_cache.put(uri, contents["data"])
+    return contents["data"]
+
+
+def api_get_items(uri, limit=DEFAULT_PAGE_LIMIT):
+    """
+    Yield the items of a cursor paginated list endpoint, each page is requested once the previous
+    one has been consumed.
+    """
+    cursor = None
+    while True:
+        query = {"limit": limit, **({"cursor": cursor} if cursor else {})}
+        data = api_get(f"{uri}?{urlencode(query)}")
+        if data is None:
+            return
+        yield from data["items"]
+        cursor = data.get("next_cursor")
+        if not cursor:
+            return
+
+
+def fetch_concurrently(function, arguments, workers=DEFAULT_WORKERS):
+    """
+    Yield function applied to each of arguments using up to workers threads, results keep the input
+    order.
+
+    Arguments are consumed lazily, at most two per worker are in flight, so a paginated listing can
+    be processed as it arrives.
+    """
+    if workers <= 1:
+        yield from map(function, arguments)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for argument in arguments:
+            pending.append(executor.submit(function, argument))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
 
+def iter_connectors(limit=DEFAULT_PAGE_LIMIT):
+    return api_get_items("connectors", limit=limit)
 
-def get_connector_list():
-    return api_get("connectors")
+
+def iter_destinations(limit=DEFAULT_PAGE_LIMIT):
+    return api_get_items("destinations", limit=limit)
+
+
+def get_connector_list(limit=DEFAULT_PAGE_LIMIT):
+    return {"items": list(iter_connectors(limit=limit))}
 
 
 def get_connector(connector_id):
@@ -53,8 +390,8 @@ def get_connector_schema(connector_id, log=True):
     return api_get(f"connectors/{connector_id}/schemas")
 
 
-def get_destination_list():
-    return api_get("destinations")
+def get_destination_list(limit=DEFAULT_PAGE_LIMIT):
+    return {"items": list(iter_destinations(limit=limit))}
 
 
 def get_destination(destination_id):
@@ -62,13 +399,11 @@ def get_destination(destination_id):
 
 
 def get_connector_id(connector_name):
-    return next(
-        item["id"] for item in api_get("connectors")["items"] if item["schema"] == connector_name
-    )
+    return next(item["id"] for item in iter_connectors() if item["schema"] == connector_name)
 
 
-def print_connector_list():
-    for item in sorted(get_connector_list()["items"], key=lambda i: i.get("schema")):
+def print_connector_list(limit=DEFAULT_PAGE_LIMIT):
+    for item in sorted(iter_connectors(limit=limit), key=lambda i: i.get("schema")):
         print(f"{item['schema']} - {item['service']} - {item['id']}")
 
 
@@ -85,44 +420,309 @@ def print_connector_schema(connector_name):
                 print(f"{schema_name}.{table_name} -> X")
 
 
-def dump_raw(output_directory):
+def load_manifest(output_directory):
+    try:
+        with open(path.join(output_directory, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"connectors": {}, "files": {}}
+
+
+def save_manifest(output_directory, manifest):
+    manifest_file = path.join(output_directory, MANIFEST_FILE)
+    temp_file = f"{manifest_file}.{getpid()}.tmp"
+    with open(temp_file, "w") as f:
+        f.write(json.dumps(manifest, indent=2, sort_keys=True))
+    replace(temp_file, manifest_file)
+
+
+def get_schema_fingerprint(connector):
+    fields = {field: connector.get(field) for field in SCHEMA_FINGERPRINT_FIELDS}
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+
+
+def is_reusable_entry(entry, connector):
+    # Entries from before fetched_at was recorded count as expired
+    return (
+        entry is not None
+        and entry["fingerprint"] == get_schema_fingerprint(connector)
+        and time.time() - entry.get("fetched_at", 0) < SCHEMA_MAX_AGE_SECONDS
+    )
+
+
+def get_manifest_entry(manifest, connector, file_name):
+    """
+    Manifest entry for a connector's schema file, fetched_at carried over when the previous schema
+    was reused rather than fetched.
+    """
+    previous = manifest["connectors"].get(connector["id"])
+    reused = is_reusable_entry(previous, connector)
+    return {
+        "fingerprint": get_schema_fingerprint(connector),
+        "file": file_name,
+        "fetched_at": previous["fetched_at"] if reused else time.time(),
+    }
+
+
+def get_unchanged_schema(output_directory, manifest, connector, key=None, bulk=None):
+    """
+    Schema written by the previous incremental dump, or None when it has to be fetched again.
+    Changes made in the Fivetran UI since can go unseen until the next sync or for up to
+    SCHEMA_MAX_AGE_SECONDS, whichever comes first.
+    """
+    if manifest is None:
+        return None
+    entry = manifest["connectors"].get(connector["id"])
+    if not is_reusable_entry(entry, connector):
+        return None
+    if bulk is not None:
+        contents = bulk.read_previous(entry["file"])
+    else:
+        try:
+            with open(path.join(output_directory, entry["file"])) as f:
+                contents = json.load(f)
+        except (OSError, ValueError):
+            contents = None
+    if contents is None:
+        return None
+    return contents if key is None else contents.get(key)
+
+
+@traced()
+def write_file(output_directory, file_name, contents, manifest=None):
+    """
+    Write contents to file_name, with a manifest the file is left untouched when the content hash
+    matches the one previously written.
+    """
+    file_path = path.join(output_directory, file_name)
+    if manifest is not None:
+        content_hash = hashlib.sha256(contents.encode()).hexdigest()
+        if manifest["files"].get(file_name) == content_hash and path.exists(file_path):
+            return False
+        manifest["files"][file_name] = content_hash
+    with open(file_path, "w") as f:
+        f.write(contents)
+    return True
+
+
+def write_record(output_directory, file_name, record, manifest=None, bulk=None):
+    if bulk is not None:
+        bulk.write(file_name, record)
+        return True
+    with span("dump.json_dumps"):
+        contents = json.dumps(record, indent=2)
+    return write_file(output_directory, file_name, contents, manifest)
+
+
+def get_bulk_index_file(bulk_file):
+    return f"{bulk_file}.index.json"
+
+
+def load_bulk_index(output_directory, file_name=BULK_FILE):
+    """
+    {record name: [offset, length, crc32]} for a bulk dump, None when there isn't one.
+    """
+    try:
+        with open(get_bulk_index_file(path.join(output_directory, file_name))) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def read_bulk_record(output_directory, name, index=None, file_name=BULK_FILE):
+    """
+    One record from a bulk dump, only its own gzip member is read and decompressed.
+    """
+    index = index if index is not None else load_bulk_index(output_directory, file_name)
+    if not index or name not in index:
+        return None
+    offset, length, _ = index[name]
+    with open(path.join(output_directory, file_name), "rb") as f:
+        f.seek(offset)
+        return json.loads(gzip.decompress(f.read(length)))["data"]
+
+
+def yield_bulk_records(output_directory, file_name=BULK_FILE):
+    with gzip.open(path.join(output_directory, file_name), "rt") as f:
+        for line in f:
+            record = json.loads(line)
+            yield record["name"], record["data"]
+
+
+class BulkWriter:
+    """
+    Writes every record of a dump to one gzip compressed NDJSON file, {"name": ..., "data": ...}
+    per line, named as the per-file layout would name the file.
+
+    Each record is its own gzip member, so the file still reads as a single stream (zcat,
+    gzip.open) while the offset index written alongside lets read_bulk_record load one record
+    without touching the rest. Both files are replaced only once the dump has completed, until
+    then the previous dump stays readable through read_previous.
+    """
+
+    def __init__(self, output_directory, file_name=BULK_FILE, compress_level=BULK_COMPRESS_LEVEL):
+        self.output_directory = output_directory
+        self.file_name = file_name
+        self.file_path = path.join(output_directory, file_name)
+        self.compress_level = compress_level
+        self.previous_index = load_bulk_index(output_directory, file_name) or {}
+        self.index = {}
+        self.temp_file = f"{self.file_path}.{getpid()}.tmp"
+        self.file = None
+
+    def __enter__(self):
+        self.file = open(self.temp_file, "wb")
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.file.close()
+        if exc_type is not None:
+            remove(self.temp_file)
+            return
+        index_file = get_bulk_index_file(self.file_path)
+        temp_index_file = f"{index_file}.{getpid()}.tmp"
+        with open(temp_index_file, "w") as f:
+            json.dump(self.index, f)
+        replace(self.temp_file, self.file_path)
+        replace(temp_index_file, index_file)
+
+    def write(self, name, record):
+        with span("dump.json_dumps"):
+            line = json.dumps({"name": name, "data": record}, separators=(",", ":")) + "\n"
+            line = line.encode()
+        offset = self.file.tell()
+        self.file.write(gzip.compress(line, compresslevel=self.compress_level, mtime=0))
+        self.index[name] = [offset, self.file.tell() - offset, zlib.crc32(line)]
+
+    def read_previous(self, name):
+        return read_bulk_record(self.output_directory, name, self.previous_index, self.file_name)
+
+
+def open_output(output_directory, output_format, file_name=BULK_FILE):
+    """
+    Context manager giving the BulkWriter for a bulk dump, None for the per-file layout.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise SystemError(f"Unknown output format {output_format}, expected {OUTPUT_FORMATS}")
+    if output_format == "bulk":
+        return BulkWriter(output_directory, file_name)
+    return nullcontext()
+
+
+def fetch_connector_raw(item, output_directory=None, manifest=None, bulk=None):
+    connector = get_connector(item["id"])
+    schema = connector and get_unchanged_schema(output_directory, manifest, connector, bulk=bulk)
+    if schema is None:
+        schema = get_connector_schema(item["id"])
+    return item, connector, schema
+
+
+@fresh_responses()
+def dump_raw(
+    output_directory,
+    workers=DEFAULT_WORKERS,
+    limit=DEFAULT_PAGE_LIMIT,
+    incremental=False,
+    output_format="files",
+):
     Path(output_directory).mkdir(parents=True, exist_ok=True)
-    for item in get_connector_list()["items"]:
-        connector_id = item["id"]
-        connector_file_prefix = f"connector-{item['schema']}-{item['service']}-{connector_id}"
-        print(connector_file_prefix)
-        # Item from list of connectors
-        with open(path.join(output_directory, f"{connector_file_prefix}-from-list.json"), "w") as f:
-            f.write(json.dumps(item, indent=2))
-        # Connector
-        connector = get_connector(connector_id)
-        if connector:
-            with open(path.join(output_directory, f"{connector_file_prefix}.json"), "w") as f:
-                f.write(json.dumps(connector, indent=2))
-        # Schema
-        schema = get_connector_schema(connector_id)
-        if schema:
-            with open(
-                path.join(output_directory, f"{connector_file_prefix}-schema.json"), "w"
-            ) as f:
-                f.write(json.dumps(schema, indent=2))
-    for item in get_destination_list()["items"]:
-        destination_id = item["id"]
-        destination = get_destination(destination_id)
-        destination_file_prefix = "-".join(
-            [
-                "destination",
-                destination["config"]["catalog"],
-                destination["region"],
-                destination["service"],
-                destination_id,
-            ]
+    manifest = load_manifest(output_directory) if incremental else None
+    with open_output(output_directory, output_format) as bulk:
+        write = partial(write_record, output_directory, manifest=manifest, bulk=bulk)
+        fetch_connector = partial(
+            fetch_connector_raw, output_directory=output_directory, manifest=manifest, bulk=bulk
         )
-        with open(path.join(output_directory, f"{destination_file_prefix}.json"), "w") as f:
-            f.write(json.dumps(destination, indent=2))
+        connectors = fetch_concurrently(fetch_connector, iter_connectors(limit=limit), workers)
+        for item, connector, schema in connectors:
+            connector_id = item["id"]
+            connector_file_prefix = f"connector-{item['schema']}-{item['service']}-{connector_id}"
+            print(connector_file_prefix)
+            # Item from list of connectors
+            write(f"{connector_file_prefix}-from-list.json", item)
+            # Connector
+            if connector:
+                write(f"{connector_file_prefix}.json", connector)
+            # Schema
+            if schema:
+                schema_file = f"{connector_file_prefix}-schema.json"
+                write(schema_file, schema)
+                if manifest is not None and connector:
+                    manifest["connectors"][connector_id] = get_manifest_entry(
+                        manifest, connector, schema_file
+                    )
+        destination_ids = (item["id"] for item in iter_destinations(limit=limit))
+        destinations = fetch_concurrently(get_destination_with_id, destination_ids, workers)
+        for destination_id, destination in destinations:
+            if destination is None:
+                continue
+            destination_file_prefix = "-".join(
+                [
+                    "destination",
+                    destination["config"]["catalog"],
+                    destination["region"],
+                    destination["service"],
+                    destination_id,
+                ]
+            )
+            write(f"{destination_file_prefix}.json", destination)
+    if manifest is not None:
+        save_manifest(output_directory, manifest)
+
+
+def get_connector_with_schema(connector_id, output_directory=None, manifest=None, bulk=None):
+    connector = get_connector(connector_id)
+    if connector is None:
+        return connector_id, None
+    schemas = get_unchanged_schema(output_directory, manifest, connector, key="schemas", bulk=bulk)
+    if schemas is None:
+        schemas = get_connector_schema(connector_id)
+    return connector_id, {**connector, **{"schemas": schemas}}
+
 
+def get_destination_with_id(destination_id):
+    return destination_id, get_destination(destination_id)
 
-def dump(output_directory):
+
+@traced("dump.write_connector")
+def write_connector(output_directory, connector_id, connector, manifest=None, bulk=None):
+    destination_catalogs = "-".join(
+        [destination["config"]["catalog"] for destination in connector["destinations"]]
+    )
+    connector_file_prefix = "-".join(
+        [
+            "connector",
+            connector["schema"],
+            connector["service"],
+            destination_catalogs,
+            connector_id,
+        ]
+    )
+    all_file = path.join("all", f"{connector_file_prefix}-from-list.json")
+    write_record(output_directory, all_file, connector, manifest, bulk)
+
+    if isinstance(connector["schemas"], dict) and "schemas" in connector["schemas"]:
+        if manifest is not None:
+            manifest["connectors"][connector_id] = get_manifest_entry(manifest, connector, all_file)
+        # Already written in full above, nothing reads the unfiltered tree after this
+        with span("dump.filter_disabled"):
+            filter_disabled(connector["schemas"]["schemas"], in_place=True)
+        write_record(
+            output_directory,
+            path.join("enabled", f"{connector_file_prefix}-from-list.json"),
+            connector,
+            manifest,
+            bulk,
+        )
+
+
+@fresh_responses()
+def dump(
+    output_directory,
+    workers=DEFAULT_WORKERS,
+    limit=DEFAULT_PAGE_LIMIT,
+    incremental=False,
+    output_format="files",
+):
     """
     Limitations based on available API:
 
@@ -132,97 +732,146 @@ def dump(output_directory):
     Ticket raised https://support.fivetran.com/hc/en-us/requests/241512
     """
 
-    Path(path.join(output_directory, "all")).mkdir(parents=True, exist_ok=True)
-    Path(path.join(output_directory, "enabled")).mkdir(parents=True, exist_ok=True)
+    Path(output_directory).mkdir(parents=True, exist_ok=True)
+    if output_format == "files":
+        Path(path.join(output_directory, "all")).mkdir(parents=True, exist_ok=True)
+        Path(path.join(output_directory, "enabled")).mkdir(parents=True, exist_ok=True)
+    manifest = load_manifest(output_directory) if incremental else None
+
+    with open_output(output_directory, output_format) as bulk:
+        # Destinations are few, fetch them up front and index them by group so each connector can
+        # be joined to its destinations and written as soon as it arrives
+        destination_ids = (item["id"] for item in iter_destinations(limit=limit))
+        destinations_by_group = defaultdict(list)
+        for destination_id, destination in fetch_concurrently(
+            get_destination_with_id, destination_ids, workers
+        ):
+            if destination is not None:
+                destinations_by_group[destination["group_id"]].append(destination)
+
+        connector_ids = (item["id"] for item in iter_connectors(limit=limit))
+        fetch_connector = partial(
+            get_connector_with_schema,
+            output_directory=output_directory,
+            manifest=manifest,
+            bulk=bulk,
+        )
+        for connector_id, connector in fetch_concurrently(fetch_connector, connector_ids, workers):
+            if connector is None:
+                continue
+            connector["destinations"] = destinations_by_group.get(connector["group_id"], [])
+            write_connector(output_directory, connector_id, connector, manifest, bulk)
 
-    connectors = {
-        item["id"]: {**get_connector(item["id"]), **{"schemas": get_connector_schema(item["id"])}}
-        for item in get_connector_list()["items"]
-    }
+    if manifest is not None:
+        save_manifest(output_directory, manifest)
 
-    destinations = {
-        item["id"]: {**get_destination(item["id"])} for item in get_destination_list()["items"]
-    }
 
-    all_group_ids = {destination["group_id"] for destination in destinations.values()}.union(
-        {connector["group_id"] for connector in connectors.values()}
-    )
+def get_connector_state_with_id(connector_id):
+    return connector_id, get_connector_state(connector_id)
 
-    groups = {
-        group_id: {
-            "connectors": {
-                connector_id
-                for connector_id in connectors
-                if connectors[connector_id]["group_id"] == group_id
-            },
-            "destinations": {
-                destination_id
-                for destination_id in destinations
-                if destinations[destination_id]["group_id"] == group_id
-            },
-        }
-        for group_id in all_group_ids
-    }
 
-    # Append destinations
-    connectors = {
-        connector_id: {
-            **connector,
-            **{
-                "destinations": [
-                    destinations[destination_id]
-                    for destination_id in groups[connector["group_id"]]["destinations"]
-                ]
-            },
-        }
-        for connector_id, connector in connectors.items()
-    }
+@fresh_responses()
+def dump_state(
+    output_directory, workers=DEFAULT_WORKERS, limit=DEFAULT_PAGE_LIMIT, output_format="files"
+):
+    Path(output_directory).mkdir(parents=True, exist_ok=True)
+    connector_ids = (item["id"] for item in iter_connectors(limit=limit))
+    states = fetch_concurrently(get_connector_state_with_id, connector_ids, workers)
 
-    for connector_id, connector in connectors.items():
-        destination_catalogs = "-".join(
-            [destination["config"]["catalog"] for destination in connector["destinations"]]
-        )
-        connector_file_prefix = "-".join(
-            [
-                "connector",
-                connector["schema"],
-                connector["service"],
-                destination_catalogs,
-                connector_id,
-            ]
-        )
-        with open(
-            path.join(output_directory, "all", f"{connector_file_prefix}-from-list.json"), "w"
-        ) as f:
-            f.write(json.dumps(connector, indent=2))
+    with open_output(output_directory, output_format, STATE_BULK_FILE) as bulk:
+        if bulk is None:
+            Path(path.join(output_directory, "all")).mkdir(parents=True, exist_ok=True)
+            Path(path.join(output_directory, "state")).mkdir(parents=True, exist_ok=True)
+            with open(path.join(output_directory, "state", f"state.json"), "w") as f:
+                f.write(json.dumps(dict(states), indent=2))
+        else:
+            # One record per connector rather than one document holding them all
+            for connector_id, state in states:
+                bulk.write(path.join("state", connector_id), state)
+
+
+def is_disabled(value):
+    return isinstance(value, dict) and "enabled" in value and not value["enabled"]
 
-        if isinstance(connector["schemas"], dict) and "schemas" in connector["schemas"]:
-            connector["schemas"]["schemas"] = filter_disabled(connector["schemas"]["schemas"])
-            with open(
-                path.join(output_directory, "enabled", f"{connector_file_prefix}-from-list.json"),
-                "w",
-            ) as f:
-                f.write(json.dumps(connector, indent=2))
 
+def filter_disabled(item, in_place=False):
+    """
+    item without the dicts marked "enabled": false, at any depth.
+
+    The tree is walked with an explicit stack rather than recursion. In place the disabled entries
+    are deleted from item itself, otherwise only dicts with something removed below them are
+    copied and fully enabled subtrees are shared with item.
+    """
+    if not isinstance(item, dict):
+        return item
+    if in_place:
+        stack = [item]
+        while stack:
+            node = stack.pop()
+            for key in [key for key, value in node.items() if is_disabled(value)]:
+                del node[key]
+            stack.extend(value for value in node.values() if isinstance(value, dict))
+        return item
+
+    # Find the dicts with something disabled below them, each stack entry carries the chain of
+    # dicts above it so they can be marked as well
+    changed = set()
+    stack = [(item, None)]
+    while stack:
+        node, ancestors = stack.pop()
+        for value in node.values():
+            if not isinstance(value, dict):
+                continue
+            if is_disabled(value):
+                chain = (node, ancestors)
+                while chain is not None and id(chain[0]) not in changed:
+                    changed.add(id(chain[0]))
+                    chain = chain[1]
+            else:
+                stack.append((value, (node, ancestors)))
+    if not changed:
+        return item
 
-def dump_state(output_directory):
-    Path(path.join(output_directory, "all")).mkdir(parents=True, exist_ok=True)
-    Path(path.join(output_directory, "state")).mkdir(parents=True, exist_ok=True)
+    # Copy just those, top down
+    def copy(node):
+        return {key: value for key, value in node.items() if not is_disabled(value)}
 
-    state = {item["id"]: get_connector_state(item["id"]) for item in get_connector_list()["items"]}
+    result = copy(item)
+    stack = [result]
+    while stack:
+        node = stack.pop()
+        for key, value in node.items():
+            if id(value) in changed:
+                node[key] = copy(value)
+                stack.append(node[key])
+    return result
 
-    with open(path.join(output_directory, "state", f"state.json"), "w") as f:
-        f.write(json.dumps(state, indent=2))
 
+def drop_disabled_pairs(pairs):
+    return {key: value for key, value in pairs if not is_disabled(value)}
 
-def filter_disabled(item):
-    if isinstance(item, dict):
-        return {
-            key: filter_disabled(value)
-            for key, value in item.items()
-            if not isinstance(value, dict) or "enabled" not in value or value["enabled"]
-        }
-    return item
+
+def filter_disabled_file(input_file, output_file):
+    """
+    filter_disabled from one schema JSON file into another. The file's text is read whole, but
+    disabled objects are dropped as the parser builds them so the unfiltered tree is never held,
+    and the result is streamed back out. Unlike filter_disabled, which doesn't descend into lists,
+    disabled dicts nested inside a list's dicts are dropped too, the parser can't tell where an
+    object sits. A disabled dict that is itself a list element is kept by both.
+    """
+    with open(input_file) as f:
+        item = json.load(f, object_pairs_hook=drop_disabled_pairs)
+    with open(output_file, "w") as f:
+        json.dump(item, f, indent=2)
+
+
+def write_enabled_schemas(output_directory):
+    """
+    enabled/ copies of the schema files written by dump_raw.
+    """
+    Path(path.join(output_directory, "enabled")).mkdir(parents=True, exist_ok=True)
+    for schema_file in sorted(Path(output_directory).glob("*-schema.json")):
+        filter_disabled_file(schema_file, path.join(output_directory, "enabled", schema_file.name))
 
 
 # To be refactored:
@@ -252,14 +901,4 @@ def get_table_columns(connector_name, find_table_name):
 # get_table_columns
 # list_connectors
 
-# find_table_name = "opportunity_line_item".lower()
-# with open("/workspace/calypso/data-pipelines/schema.json") as f:
-#     data = json.loads(f.read())
-#     table = [
-#         table
-#         for schema_name, schema in data["schemas"].items()
-#         for table_name, table in schema["tables"].items()
-#         if table_name.lower() == find_table_name
-#         or table["name_in_destination"].lower() == find_table_name
-#     ]
-#     print(json.dumps(table[0], indent=2))
+# Table / column lookups across all connectors from dump output: see fivetran_index.py
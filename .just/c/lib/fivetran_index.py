@@ -0,0 +1,220 @@
+import json
+import os
+import sqlite3
+import sys
+from glob import glob
+from os import path
+
+try:
+    from .fivetran_helper import BULK_FILE, load_bulk_index, read_bulk_record
+except ImportError:
+    from fivetran_helper import BULK_FILE, load_bulk_index, read_bulk_record
+
+# Searchable index of every schema / table / column across all connectors, built from the files
+# written by fivetran_helper.dump into <output_directory>/all, or the all/ records of a bulk dump
+
+INDEX_FILE = "column-index.sqlite"
+
+COLUMN_FIELDS = [
+    "connector_id",
+    "connector_schema",
+    "service",
+    "destination_catalogs",
+    "schema_name",
+    "schema_destination",
+    "schema_enabled",
+    "table_name",
+    "table_destination",
+    "table_enabled",
+    "column_name",
+    "column_destination",
+    "column_enabled",
+]
+TABLE_FIELDS = COLUMN_FIELDS[: COLUMN_FIELDS.index("table_enabled") + 1]
+
+
+def connect(output_directory):
+    database = sqlite3.connect(path.join(output_directory, INDEX_FILE))
+    database.executescript(
+        f"""
+        CREATE TABLE IF NOT EXISTS files (file TEXT PRIMARY KEY, mtime INTEGER, size INTEGER);
+        CREATE TABLE IF NOT EXISTS columns (file TEXT, {", ".join(COLUMN_FIELDS)});
+        CREATE INDEX IF NOT EXISTS columns_file ON columns (file);
+        CREATE INDEX IF NOT EXISTS columns_table_name ON columns (table_name COLLATE NOCASE);
+        CREATE INDEX IF NOT EXISTS columns_table_destination
+            ON columns (table_destination COLLATE NOCASE);
+        CREATE INDEX IF NOT EXISTS columns_column_name ON columns (column_name COLLATE NOCASE);
+        CREATE INDEX IF NOT EXISTS columns_column_destination
+            ON columns (column_destination COLLATE NOCASE);
+        """
+    )
+    return database
+
+
+def yield_column_rows(connector):
+    destination_catalogs = "-".join(
+        destination["config"]["catalog"] for destination in connector.get("destinations", [])
+    )
+    connector_fields = (
+        connector["id"],
+        connector["schema"],
+        connector["service"],
+        destination_catalogs,
+    )
+    schemas = connector.get("schemas")
+    if not isinstance(schemas, dict):
+        return
+    for schema_name, schema in schemas.get("schemas", {}).items():
+        schema_fields = (schema_name, schema.get("name_in_destination"), schema.get("enabled"))
+        for table_name, table in schema.get("tables", {}).items():
+            table_fields = (table_name, table.get("name_in_destination"), table.get("enabled"))
+            columns = table.get("columns", {})
+            if not columns:
+                yield connector_fields + schema_fields + table_fields + (None, None, None)
+            for column_name, column in columns.items():
+                column_fields = (
+                    column_name,
+                    column.get("name_in_destination"),
+                    column.get("enabled"),
+                )
+                yield connector_fields + schema_fields + table_fields + column_fields
+
+
+def warn(message):
+    # stderr, so query output piped elsewhere stays clean
+    print(message, file=sys.stderr)
+
+
+def get_connector_id(name):
+    # all/connector-<schema>-<service>-<catalogs>-<connector id>-from-list.json, ids have no "-"
+    return name[: -len("-from-list.json")].rsplit("-", 1)[-1]
+
+
+def get_connector_files(output_directory):
+    """
+    ({name: stamp}, bulk index) for the connectors of a dump, names are all/ files or the all/
+    records of a bulk dump and a stamp changes whenever its connector does.
+
+    The per-file layout never deletes old files, so a connector whose schema or destination
+    changed since can have several all/ files, only the most recently written is used. A directory
+    holding both layouts uses whichever was written last, they are never mixed.
+    """
+    stats = []
+    for file_path in glob(path.join(output_directory, "all", "*.json")):
+        stat = os.stat(file_path)
+        stats.append((stat.st_mtime_ns, stat.st_size, path.relpath(file_path, output_directory)))
+    names = {}
+    for _, _, name in sorted(stats):
+        names[get_connector_id(name)] = name
+    kept = set(names.values())
+    current = {name: (mtime, size) for mtime, size, name in stats if name in kept}
+    for _, _, name in stats:
+        if name not in kept:
+            newer = names[get_connector_id(name)]
+            warn(f"Ignoring {name}, {newer} is a newer dump of the same connector")
+
+    # Records of a bulk dump are stamped by their CRC in place of an mtime
+    bulk_index = load_bulk_index(output_directory, BULK_FILE) or {}
+    bulk = {
+        name: (crc, length)
+        for name, (_, length, crc) in bulk_index.items()
+        if name.startswith("all/")
+    }
+    if bulk and current:
+        bulk_mtime = os.stat(path.join(output_directory, BULK_FILE)).st_mtime_ns
+        if bulk_mtime >= max(mtime for mtime, _, _ in stats):
+            warn(f"Ignoring the all/ files, {BULK_FILE} was written after them")
+            current = {}
+        else:
+            warn(f"Ignoring {BULK_FILE}, the all/ files were written after it")
+            return current, {}
+    return {**current, **bulk}, bulk_index
+
+
+def load_connector(output_directory, name, bulk_index=None):
+    if bulk_index and name in bulk_index:
+        return read_bulk_record(output_directory, name, bulk_index, BULK_FILE)
+    with open(path.join(output_directory, name)) as f:
+        return json.load(f)
+
+
+def update_index(output_directory):
+    """
+    Bring the index in line with the dump, only files added, changed or removed since the last
+    update are read.
+    """
+    database = connect(output_directory)
+    indexed = {
+        file: (mtime, size)
+        for file, mtime, size in database.execute("SELECT file, mtime, size FROM files")
+    }
+    current, bulk_index = get_connector_files(output_directory)
+
+    stale = [file for file in indexed if indexed[file] != current.get(file)]
+    fresh = [file for file in current if indexed.get(file) != current[file]]
+    placeholders = ", ".join("?" * (len(COLUMN_FIELDS) + 1))
+    with database:
+        for file in stale:
+            database.execute("DELETE FROM columns WHERE file = ?", (file,))
+            database.execute("DELETE FROM files WHERE file = ?", (file,))
+        for file in fresh:
+            connector = load_connector(output_directory, file, bulk_index)
+            database.executemany(
+                f"INSERT INTO columns VALUES ({placeholders})",
+                ((file, *row) for row in yield_column_rows(connector)),
+            )
+            database.execute("INSERT INTO files VALUES (?, ?, ?)", (file, *current[file]))
+    removed = len([file for file in indexed if file not in current])
+    print(f"Index updated, {len(fresh)} files added or changed, {removed} removed")
+    return database
+
+
+def find(database, name, match_fields, select_fields=COLUMN_FIELDS):
+    # A % in the name switches to a LIKE pattern, otherwise it is an exact case-insensitive match
+    operator = "LIKE" if "%" in name else "="
+    condition = " OR ".join(f"{field} {operator} ? COLLATE NOCASE" for field in match_fields)
+    rows = database.execute(
+        f"SELECT DISTINCT {', '.join(select_fields)} FROM columns WHERE {condition} "
+        f"ORDER BY {', '.join(select_fields)}",
+        [name] * len(match_fields),
+    ).fetchall()
+    padding = (None,) * (len(COLUMN_FIELDS) - len(select_fields))
+    return [row + padding for row in rows]
+
+
+def format_mapping(row):
+    row = dict(zip(COLUMN_FIELDS, row))
+    source = ".".join(
+        part for part in (row["schema_name"], row["table_name"], row["column_name"]) if part
+    )
+    # sqlite hands booleans back as 0 / 1, column_enabled is None for tables without columns
+    enabled = (
+        row["schema_enabled"]
+        and row["table_enabled"]
+        and (row["column_enabled"] is None or row["column_enabled"])
+    )
+    if not enabled:
+        return f"{row['connector_schema']} ({row['service']}) {source} -> X"
+    destination = ".".join(
+        part
+        for part in (
+            row["destination_catalogs"],
+            row["schema_destination"],
+            row["table_destination"],
+            row["column_destination"],
+        )
+        if part
+    )
+    return f"{row['connector_schema']} ({row['service']}) {source} -> {destination}"
+
+
+def print_column_sources(output_directory, column_name):
+    database = update_index(output_directory)
+    for row in find(database, column_name, ["column_name", "column_destination"]):
+        print(format_mapping(row))
+
+
+def print_table_sources(output_directory, table_name):
+    database = update_index(output_directory)
+    for row in find(database, table_name, ["table_name", "table_destination"], TABLE_FIELDS):
+        print(format_mapping(row))
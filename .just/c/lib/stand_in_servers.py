@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+import argparse
+import json
+import random
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# Local stand-ins for the Fivetran and Databricks endpoints the helpers call, with a synthetic account
+# of configurable size, per request latency and injected 429s, for benchmarking without credentials
+#   Fivetran    <url>/v1/connectors, /connectors/{id}, /{id}/schemas, /{id}/state, /destinations
+#   Databricks  <url>/api/2.0/preview/scim/v2/Me, /api/2.1/jobs/list, /api/2.2/jobs/list
+#   Counters    <url>/_stats
+# e.g. ./stand_in_servers.py --connectors 200 --columns 50 --latency 0.05 --throttle 0.02
+#      FIVETRAN_API_URL=http://127.0.0.1:8765/v1 FIVETRAN_REQUESTS_PER_SECOND=1000 ...
+
+
+class Account:
+    """
+    Deterministic synthetic account, every disabled_every-th table and column is disabled.
+    """
+
+    def __init__(
+        self,
+        connectors=50,
+        destinations=3,
+        schemas=2,
+        tables=20,
+        columns=20,
+        jobs=200,
+        disabled_every=10,
+    ):
+        self.connector_count = connectors
+        self.destination_count = destinations
+        self.schemas = schemas
+        self.tables = tables
+        self.columns = columns
+        self.job_count = jobs
+        self.disabled_every = disabled_every
+
+    def is_enabled(self, number):
+        return number % self.disabled_every != self.disabled_every - 1
+
+    def get_connector(self, number):
+        return {
+            "id": f"connector_{number}",
+            "group_id": f"group_{number % self.destination_count}",
+            "service": ["salesforce", "google_ads", "postgres"][number % 3],
+            "schema": f"schema_{number}",
+            "paused": False,
+            "succeeded_at": "2024-01-01T00:00:00.000Z",
+            "failed_at": None,
+            "status": {"setup_state": "connected", "sync_state": "scheduled"},
+            "config": {"is_sandbox": False},
+        }
+
+    def get_connectors(self):
+        return [self.get_connector(number) for number in range(self.connector_count)]
+
+    def get_schema(self, number):
+        return {
+            "schema_change_handling": "ALLOW_COLUMNS",
+            "schemas": {
+                f"source_{schema}": {
+                    "name_in_destination": f"source_{schema}",
+                    "enabled": True,
+                    "tables": {
+                        f"table_{table}": {
+                            "name_in_destination": f"table_{table}",
+                            "enabled": self.is_enabled(number + table),
+                            "sync_mode": "SOFT_DELETE",
+                            "columns": {
+                                f"column_{column}": {
+                                    "name_in_destination": f"column_{column}",
+                                    "enabled": self.is_enabled(table * self.columns + column),
+                                    "hashed": False,
+                                }
+                                for column in range(self.columns)
+                            },
+                        }
+                        for table in range(self.tables)
+                    },
+                }
+                for schema in range(self.schemas)
+            },
+        }
+
+    def get_destination(self, number):
+        return {
+            "id": f"destination_{number}",
+            "group_id": f"group_{number}",
+            "service": "databricks",
+            "region": "AWS_US_EAST_1",
+            "config": {"catalog": f"catalog_{number}"},
+        }
+
+    def get_jobs(self):
+        return [
+            {
+                "job_id": 1000 + number,
+                "created_time": 1700000000000 + number,
+                "settings": {"name": f"job_{number}"},
+            }
+            for number in range(self.job_count)
+        ]
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, account, latency=0.0, throttle=0.0, retry_after="0", seed=0):
+        super().__init__(address, StandInHandler)
+        self.account = account
+        self.latency = latency
+        self.throttle = throttle
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "throttled": 0}
+        # Responses are built once, large schemas cost more to generate than to send
+        self.get_body = lru_cache(maxsize=4096)(self.build_body)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def should_throttle(self):
+        with self.lock:
+            self.stats["requests"] += 1
+            if self.throttle and self.random.random() < self.throttle:
+                self.stats["throttled"] += 1
+                return True
+        return False
+
+    def build_body(self, path, query):
+        query = parse_qs(query)
+        parts = path.strip("/").split("/")
+        if parts[0] == "v1":
+            return build_fivetran_response(self.account, parts[1:], query)
+        if path == "/api/2.0/preview/scim/v2/Me":
+            return 200, {
+                "userName": "stand.in@example.com",
+                "displayName": "Stand In",
+                "name": {"givenName": "Stand", "familyName": "In"},
+            }
+        # 2.2 is what current databricks-sdk releases call, 2.1 older ones
+        if path in ("/api/2.1/jobs/list", "/api/2.2/jobs/list"):
+            return build_jobs_response(self.account, query)
+        return 404, {"error_code": "NOT_FOUND", "message": f"No stand-in for {path}"}
+
+
+def get_page(items, query, default_limit):
+    limit = int(query.get("limit", [default_limit])[0])
+    start = int(query.get("cursor", query.get("page_token", ["0"]))[0])
+    end = start + limit
+    return items[start:end], (str(end) if end < len(items) else None)
+
+
+def build_fivetran_response(account, parts, query):
+    def success(data):
+        return 200, {"code": "Success", "data": data}
+
+    def listing(items):
+        page, next_cursor = get_page(items, query, 100)
+        return success({"items": page, **({"next_cursor": next_cursor} if next_cursor else {})})
+
+    numbers = {"connectors": account.connector_count, "destinations": account.destination_count}
+    if len(parts) == 1 and parts[0] == "connectors":
+        return listing(account.get_connectors())
+    if len(parts) == 1 and parts[0] == "destinations":
+        return listing([{"id": f"destination_{n}"} for n in range(account.destination_count)])
+    if len(parts) >= 2 and parts[0] in numbers:
+        prefix = parts[0][:-1]
+        number = parts[1][len(prefix) + 1 :]
+        if parts[1].startswith(f"{prefix}_") and number.isdigit() and int(number) < numbers[parts[0]]:
+            number = int(number)
+            if parts[0] == "destinations" and len(parts) == 2:
+                return success(account.get_destination(number))
+            if parts[0] == "connectors" and len(parts) == 2:
+                return success(account.get_connector(number))
+            if parts[0] == "connectors" and parts[2:] == ["schemas"]:
+                return success(account.get_schema(number))
+            if parts[0] == "connectors" and parts[2:] == ["state"]:
+                return success({"state": {"cursor": number}})
+    return 404, {"code": "NotFound", "message": f"No stand-in for {'/'.join(parts)}"}
+
+
+def build_jobs_response(account, query):
+    jobs = account.get_jobs()
+    if "name" in query:
+        jobs = [job for job in jobs if job["settings"]["name"] == query["name"][0]]
+    page, next_page_token = get_page(jobs, query, 20)
+    response = {"jobs": page, "has_more": next_page_token is not None}
+    if next_page_token:
+        response["next_page_token"] = next_page_token
+    return 200, response
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Small responses otherwise sit behind Nagle's algorithm waiting for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, data, headers=None):
+        body = data if isinstance(data, bytes) else json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/_stats":
+            with self.server.lock:
+                return self.send_json(200, dict(self.server.stats))
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if self.server.should_throttle():
+            return self.send_json(
+                429, {"code": "TooManyRequests"}, {"Retry-After": self.server.retry_after}
+            )
+        status, data = self.server.get_body(url.path, url.query)
+        self.send_json(status, data)
+
+
+def start(account=None, host="127.0.0.1", port=0, **options):
+    """
+    StandInServer serving on a background thread, port 0 picks a free one.
+    """
+    server = StandInServer((host, port), account or Account(), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_arguments(parser):
+    parser.add_argument("--connectors", type=int, default=50)
+    parser.add_argument("--destinations", type=int, default=3)
+    parser.add_argument("--schemas", type=int, default=2)
+    parser.add_argument("--tables", type=int, default=20)
+    parser.add_argument("--columns", type=int, default=20)
+    parser.add_argument("--jobs", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--throttle", type=float, default=0.0, help="fraction of requests given a 429")
+    parser.add_argument("--retry-after", default="0")
+
+
+def get_account(arguments):
+    return Account(
+        connectors=arguments.connectors,
+        destinations=arguments.destinations,
+        schemas=arguments.schemas,
+        tables=arguments.tables,
+        columns=arguments.columns,
+        jobs=arguments.jobs,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    arguments = parser.parse_args()
+    server = StandInServer(
+        (arguments.host, arguments.port),
+        get_account(arguments),
+        latency=arguments.latency,
+        throttle=arguments.throttle,
+        retry_after=arguments.retry_after,
+    )
+    # Flushed so a parent process can read the URL before the first request
+    print(json.dumps({"url": server.url}), flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
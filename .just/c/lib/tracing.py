@@ -0,0 +1,124 @@
+import atexit
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+# Lightweight timing of the helpers' hot paths, off unless HELPER_TRACE is set:
+#   HELPER_TRACE=1                       per span count / total / p95 summary on stderr at exit
+#   HELPER_TRACE=/tmp/trace.json         the summary plus a Chrome trace (chrome://tracing, Perfetto)
+#   HELPER_TRACE_SUMMARY=/tmp/sum.json   the summary as JSON as well
+
+TRACE = os.environ.get("HELPER_TRACE", "")
+TRACE_SUMMARY_FILE = os.environ.get("HELPER_TRACE_SUMMARY", "")
+ENABLED = bool(TRACE)
+
+_events = []
+_events_lock = threading.Lock()
+_start = time.perf_counter()
+
+
+def record(name, start, end):
+    with _events_lock:
+        _events.append((name, start, end, threading.get_ident()))
+
+
+@contextlib.contextmanager
+def _span(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, start, time.perf_counter())
+
+
+def span(name):
+    """
+    Context manager timing the enclosed block as name.
+    """
+    return _span(name) if ENABLED else contextlib.nullcontext()
+
+
+def traced(name=None):
+    """
+    Decorator timing each call of the function, the function is returned untouched when tracing is
+    disabled so there is no overhead.
+    """
+
+    def decorator(function):
+        if not ENABLED:
+            return function
+        span_name = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with _span(span_name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def get_summary():
+    durations = {}
+    for name, start, end, _ in _events:
+        durations.setdefault(name, []).append(end - start)
+    summary = {}
+    for name, values in durations.items():
+        values.sort()
+        summary[name] = {
+            "count": len(values),
+            "total_ms": sum(values) * 1000,
+            "p95_ms": percentile(values, 0.95) * 1000,
+            "max_ms": values[-1] * 1000,
+        }
+    return summary
+
+
+def write_chrome_trace(file_path):
+    pid = os.getpid()
+    events = [
+        {
+            "name": name,
+            "ph": "X",
+            "ts": (start - _start) * 1e6,
+            "dur": (end - start) * 1e6,
+            "pid": pid,
+            "tid": tid,
+        }
+        for name, start, end, tid in _events
+    ]
+    with open(file_path, "w") as file:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+
+def report():
+    if not _events:
+        return
+    summary = get_summary()
+    print(f"{'span':<40} {'count':>7} {'total ms':>10} {'p95 ms':>9} {'max ms':>9}", file=sys.stderr)
+    for name, stats in sorted(summary.items(), key=lambda item: -item[1]["total_ms"]):
+        print(
+            f"{name:<40} {stats['count']:>7} {stats['total_ms']:>10.1f}"
+            f" {stats['p95_ms']:>9.1f} {stats['max_ms']:>9.1f}",
+            file=sys.stderr,
+        )
+    if TRACE not in ("1", "true"):
+        write_chrome_trace(TRACE)
+        print(f"Chrome trace written to {TRACE}", file=sys.stderr)
+    if TRACE_SUMMARY_FILE:
+        with open(TRACE_SUMMARY_FILE, "w") as file:
+            json.dump(summary, file, indent=2)
+
+
+if ENABLED:
+    atexit.register(report)
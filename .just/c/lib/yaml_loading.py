@@ -0,0 +1,36 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import yaml
+
+try:
+    from .tracing import traced
+except ImportError:
+    from tracing import traced
+
+# libyaml based loader when PyYAML was built against it, otherwise the pure Python one
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+YAML_PROCESSES = min(os.cpu_count() or 1, 8)
+# Below this many files the process pool start up costs more than it saves
+PARALLEL_YAML_THRESHOLD = 32
+
+
+def load_yaml(file_path, loader=YAML_LOADER):
+    with open(file_path) as file:
+        return yaml.load(file, Loader=loader)
+
+
+@traced()
+def load_yaml_files(file_paths, processes=YAML_PROCESSES, loader=YAML_LOADER):
+    """
+    Parse YAML files returning their contents in the same order as file_paths.
+
+    Files are spread across a process pool when there are enough of them to pay for it.
+    """
+    file_paths = list(file_paths)
+    if processes <= 1 or len(file_paths) < PARALLEL_YAML_THRESHOLD:
+        return [load_yaml(file_path, loader=loader) for file_path in file_paths]
+    chunksize = max(1, len(file_paths) // (processes * 4))
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(partial(load_yaml, loader=loader), file_paths, chunksize=chunksize))
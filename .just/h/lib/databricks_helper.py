@@ -1,31 +1,53 @@
 # %%
 import json
 import os
+import subprocess
 from copy import deepcopy
 from functools import lru_cache
 
-import git
 import yaml
-from databricks.sdk import WorkspaceClient
 
+# Git discovery and the Databricks SDK are only paid for by the functions that need them, the
+# directory constants below are resolved on first access through __getattr__
 
+TARGET_PREFIX = "personal_dev"
+DATABRICKS_PROFILE = "reporting"
+
+
+@lru_cache()
 def get_git_root():
-    git_repo = git.Repo(os.curdir, search_parent_directories=True)
-    git_root = git_repo.git.rev_parse("--show-toplevel")
-    return git_root
+    return subprocess.run(
+        ["git", "rev-parse", "--show-toplevel"], capture_output=True, text=True, check=True
+    ).stdout.strip()
 
 
-REPO_DIRECTORY = get_git_root()
-RESOURCES_DIRECTORY = f"{REPO_DIRECTORY}/resources"
-SQL_DIRECTORY = f"{REPO_DIRECTORY}/sql"
-LEN_RESOURCES_DIRECTORY = len(RESOURCES_DIRECTORY)
-TEMP_JOB_DIRECTORY = os.path.join(RESOURCES_DIRECTORY, "_temp_")
-TARGET_PREFIX = "personal_dev"
-DATABRICKS_PROFILE = "reporting"
+def get_resources_directory():
+    return f"{get_git_root()}/resources"
+
+
+def get_sql_directory():
+    return f"{get_git_root()}/sql"
+
+
+LAZY_CONSTANTS = {
+    "REPO_DIRECTORY": get_git_root,
+    "RESOURCES_DIRECTORY": get_resources_directory,
+    "SQL_DIRECTORY": get_sql_directory,
+    "LEN_RESOURCES_DIRECTORY": lambda: len(get_resources_directory()),
+    "TEMP_JOB_DIRECTORY": lambda: os.path.join(get_resources_directory(), "_temp_"),
+}
+
+
+def __getattr__(name):
+    if name in LAZY_CONSTANTS:
+        return LAZY_CONSTANTS[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 @lru_cache()
 def get_workspace_client(profile=DATABRICKS_PROFILE):
+    from databricks.sdk import WorkspaceClient
+
     return WorkspaceClient(profile=profile)
 
 
@@ -46,7 +68,9 @@ def get_schema_prefix(profile=DATABRICKS_PROFILE):
 
 @lru_cache()
 def load_databricks_configuration():
-    return yaml.load(open(os.path.join(RESOURCES_DIRECTORY, "databricks.yml")), Loader=yaml.SafeLoader)
+    return yaml.load(
+        open(os.path.join(get_resources_directory(), "databricks.yml")), Loader=yaml.SafeLoader
+    )
 
 
 # def get_catalog_identifier(target):
@@ -134,7 +158,7 @@ def inject_parameters_into_sql_file(target, sql_file):
     # parameters = find_parameters_for_sql_task(target, sql_file)
     parameters = {"schema_prefix": "paul_burridge_", "catalog_prefix": "rpt_"}
     output = ["%sql\n"]
-    with open(os.path.join(SQL_DIRECTORY, sql_file)) as file:
+    with open(os.path.join(get_sql_directory(), sql_file)) as file:
         while line := file.readline():
             if "{" in line:
                 new_line = (